@@ -1,6 +1,10 @@
 from .core import Configurator
-from .core import BaseStrategy, Context
+from .core import SecretStorage, SecretBackend, FileSecretBackend, EnvironSecretBackend, VaultSecretBackend
+from .core import BaseStrategy, AsyncBaseStrategy, Context
 from .core import DependencyStorage, Dependency, inject
+from .core import SINGLETON, SCOPED, TRANSIENT
+from .core import LazyDependency
+from .core import DependencyException, DependencyCycleException
 from .core import ResponseHandler, BaseResponseHandler
 from .core import Self
 from .core import storageMapper, Storage, StorageStrategy, StorageMapper
@@ -30,6 +34,13 @@ from .schema import FormParameter
 from .schema import QueryParameter
 from .schema import CookieParameter
 from .schema import Itinerary
+from .schema import BaseRule
+from .schema import DefaultRule
+from .schema import VarRule
+from .schema import IntRule
+from .schema import FloatRule
+from .schema import UUIDRule
+from .schema import StaticHandler
 from .schema import BaseColumn
 from .schema import Column
 from .schema import BaseCollection
@@ -125,11 +136,23 @@ __all__ = (
     "UUID4",
     "Key",
     "Configurator",
+    "SecretStorage",
+    "SecretBackend",
+    "FileSecretBackend",
+    "EnvironSecretBackend",
+    "VaultSecretBackend",
     "BaseStrategy",
+    "AsyncBaseStrategy",
     "Context",
     "DependencyStorage",
     "Dependency",
     "inject",
+    "SINGLETON",
+    "SCOPED",
+    "TRANSIENT",
+    "LazyDependency",
+    "DependencyException",
+    "DependencyCycleException",
     "BaseResponseHandler",
     "ResponseHandler",
     "Self",
@@ -166,6 +189,13 @@ __all__ = (
     "QueryParameter",
     "CookieParameter",
     "Itinerary",
+    "BaseRule",
+    "DefaultRule",
+    "VarRule",
+    "IntRule",
+    "FloatRule",
+    "UUIDRule",
+    "StaticHandler",
     "BaseColumn",
     "Column",
     "BaseCollection",
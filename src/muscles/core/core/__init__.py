@@ -1,6 +1,10 @@
 from .configure import Configurator
-from .context import BaseStrategy, Context
+from .configure import SecretStorage, SecretBackend, FileSecretBackend, EnvironSecretBackend, VaultSecretBackend
+from .context import BaseStrategy, AsyncBaseStrategy, Context
 from .dependency import DependencyStorage, Dependency, inject
+from .dependency import SINGLETON, SCOPED, TRANSIENT
+from .dependency import LazyDependency
+from .dependency import DependencyException, DependencyCycleException
 from .heandler import ResponseHandler, BaseResponseHandler
 from .self import Self
 from .storage import storageMapper, Storage, StorageStrategy, StorageMapper
@@ -13,11 +17,23 @@ __all__ = (
     "EventsStorageInterface",
     "EventsStorage",
     "Configurator",
+    "SecretStorage",
+    "SecretBackend",
+    "FileSecretBackend",
+    "EnvironSecretBackend",
+    "VaultSecretBackend",
     "BaseStrategy",
+    "AsyncBaseStrategy",
     "Context",
     "DependencyStorage",
     "Dependency",
     "inject",
+    "SINGLETON",
+    "SCOPED",
+    "TRANSIENT",
+    "LazyDependency",
+    "DependencyException",
+    "DependencyCycleException",
     "BaseResponseHandler",
     "ResponseHandler",
     "Self",
@@ -4,6 +4,8 @@ import os
 import glob
 import pathlib
 import re
+import threading
+from abc import ABC, abstractmethod
 from collections import ChainMap
 
 basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), ''))
@@ -171,19 +173,210 @@ def include_list_constructor(loader, node):
         return yaml.load(open(os.path.join(configStorage.basedir, file)), Loader=yaml.FullLoader)
 
 
+_missing = object()
+
+
+class SecretBackend(ABC):
+    """
+    Источник значений для тега `!secret`
+
+    """
+
+    @abstractmethod
+    def get(self, tag: str, default: typing.Any = None) -> typing.Any:
+        """
+        Возвращает значение секрета
+
+        :param tag: Название секрета
+        :param default: вернет, если секрет не найден
+        :return: typing.Any
+        """
+        pass
+
+    def reset(self) -> None:
+        """
+        Вызывается в начале каждой загрузки конфигурации
+
+        :return: None
+        """
+        pass
+
+
+class FileSecretBackend(SecretBackend):
+    """
+    Секреты из YAML файла, по умолчанию config/secret.yaml в директории проекта.
+    Файл разбирается один раз и хранится в кеше по пути и времени изменения, время изменения проверяется один раз
+    за загрузку конфигурации
+
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param path: путь к файлу секретов, относительный путь считается от директории проекта
+        """
+        self.path = path
+        self._cache = {}
+        self._checked = set()
+        self._lock = threading.Lock()
+
+    def file(self) -> str:
+        """
+        Возвращает полный путь к файлу секретов
+
+        :return: str
+        """
+        path = self.path if self.path is not None else './config/secret.yaml'
+        basedir = ConfigStorage().basedir
+        if basedir is not None and not os.path.isabs(path):
+            path = os.path.join(basedir, path)
+        return os.path.abspath(path)
+
+    def values(self) -> dict:
+        """
+        Возвращает разобранный файл секретов
+
+        :return: dict
+        """
+        path = self.file()
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and path in self._checked:
+                return cached[1]
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                # Отсутствие файла тоже кешируется до следующей загрузки конфигурации
+                cached = self._cache[path] = (None, {})
+                self._checked.add(path)
+                return cached[1]
+            if cached is None or cached[0] != mtime:
+                with open(path) as file:
+                    cached = (mtime, yaml.load(file, Loader=yaml.FullLoader) or {})
+                self._cache[path] = cached
+            self._checked.add(path)
+            return cached[1]
+
+    def get(self, tag: str, default: typing.Any = None) -> typing.Any:
+        return self.values().get(tag, default)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checked.clear()
+
+
+class EnvironSecretBackend(SecretBackend):
+    """
+    Секреты из переменных окружения `<prefix><tag>`
+
+    """
+
+    def __init__(self, prefix: str = ''):
+        """
+        :param prefix: префикс названия переменной окружения
+        """
+        self.prefix = prefix
+
+    def get(self, tag: str, default: typing.Any = None) -> typing.Any:
+        return os.environ.get(self.prefix + tag, default)
+
+
+class VaultSecretBackend(SecretBackend):
+    """
+    Локальное хранилище секретов в памяти процесса с интерфейсом хранилища секретов. Подходит для тестов и как
+    основа для подключения внешнего хранилища
+
+    """
+
+    def __init__(self, secrets: typing.Optional[dict] = None):
+        """
+        :param secrets: начальные значения секретов
+        """
+        self._secrets = dict(secrets or {})
+
+    def set(self, tag: str, value: typing.Any) -> None:
+        """
+        Сохраняет значение секрета
+
+        :param tag: Название секрета
+        :param value: Значение
+        :return: None
+        """
+        self._secrets[tag] = value
+
+    def get(self, tag: str, default: typing.Any = None) -> typing.Any:
+        return self._secrets.get(tag, default)
+
+
+class SecretStorage:
+    """
+    Список источников секретов, которые по порядку опрашивает тег `!secret`. По умолчанию содержит только
+    FileSecretBackend
+
+    """
+
+    backends = [FileSecretBackend()]
+
+    @classmethod
+    def set_backends(cls, *backends: SecretBackend) -> None:
+        """
+        Заменяет источники секретов
+
+        :param backends: Источники секретов в порядке опроса
+        :return: None
+        """
+        cls.backends = list(backends)
+
+    @classmethod
+    def add_backend(cls, backend: SecretBackend, first: bool = False) -> None:
+        """
+        Добавляет источник секретов
+
+        :param backend: Источник секретов
+        :param first: опрашивать его раньше остальных
+        :return: None
+        """
+        if first:
+            cls.backends = [backend] + cls.backends
+        else:
+            cls.backends = cls.backends + [backend]
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Начинает новый цикл загрузки конфигурации, источники заново проверяют свои данные
+
+        :return: None
+        """
+        for backend in cls.backends:
+            backend.reset()
+
+    @classmethod
+    def get(cls, tag: str, default: typing.Any = None) -> typing.Any:
+        """
+        Возвращает значение секрета из первого источника, в котором он найден
+
+        :param tag: Название секрета
+        :param default: вернет, если секрет не найден
+        :return: typing.Any
+        """
+        for backend in cls.backends:
+            value = backend.get(tag, _missing)
+            if value is not _missing:
+                return value
+        return default
+
+
 def secret_constructor(loader, node):
     """
-    Подтягивает значение из файла secret.yaml, в котором спрятаны все важные для безопасности объекты, такие как
-    пароли, ключи или другие часто повторяемые значения
+    Подтягивает значение из источников секретов SecretStorage, по умолчанию из файла secret.yaml, в котором спрятаны
+    все важные для безопасности объекты, такие как пароли, ключи или другие часто повторяемые значения
 
     :param loader: Загрузчик конструктора YAML
     :param node: значение
     :return: Откорректированное значение
     """
-    configStorage = ConfigStorage()
     tag = loader.construct_scalar(node)
-    values = yaml.load(open(os.path.join(configStorage.basedir, './config/secret.yaml')), Loader=yaml.FullLoader)
-    return values.get(tag, None)
+    return SecretStorage.get(tag, None)
 
 
 def permission_constructor(loader, node):
@@ -235,10 +428,10 @@ class Configurator:
 
     _object = {}
     _file = None
-    iter_index = 0
     _params = {}
     _name = None
     _instance = None
+    _children = None
     basedir = None
 
     def update_param(self, key: str, value: typing.Any) -> None:
@@ -261,6 +454,7 @@ class Configurator:
         :param file: путь к файлу конфигурации
         :param basedir: установка директории проекта
         """
+        self._children = {}
         configStorage = ConfigStorage(name)
         if configStorage.basedir is None and basedir is not None:
             Configurator.basedir = basedir
@@ -280,6 +474,7 @@ class Configurator:
                     # print(configStorage.basedir)
                     # print(os.path.join(configStorage.basedir, file))
                     # self._object = yaml.load(open(os.path.join(configStorage.basedir, file)), Loader=yaml.Loader)
+                    SecretStorage.reset()
                     self._object = yaml.load(open(os.path.join(basedir, file)), Loader=yaml.Loader)
                 except TypeError as e:
                     raise e
@@ -288,47 +483,64 @@ class Configurator:
         except ValueError as e:
             raise ConfiguratorConfigFileNotFound(e)
 
-    def _clone(self) -> typing.Any:
+    def _clone(self, value: typing.Any = None) -> typing.Any:
         """
-        Создает клон объекта
+        Создает объект конфигурации для вложенного значения без вызова конструктора
 
+        :param value: Вложенное значение конфигурации
         :return: Configurator
         """
-        obj = type(self)(obj=self._object, file=self._file)
+        obj = object.__new__(type(self))
+        obj._object = value
+        obj._file = self._file
         obj._params = self._params
+        obj._children = {}
         return obj
 
+    def _child(self, key, value: typing.Any) -> typing.Any:
+        """
+        Возвращает объект конфигурации вложенного значения. Объект используется повторно, пока по ключу
+        хранится то же значение, поэтому повторное чтение конфигурации не создает новых объектов, а измененное
+        значение сразу видно при следующем обращении
+
+        :param key: Ключ или индекс вложенного значения
+        :param value: Текущее вложенное значение конфигурации
+        :return: Configurator
+        """
+        children = self._children
+        if children is None:
+            children = self._children = {}
+        child = children.get(key)
+        if child is None or child._object is not value:
+            child = children[key] = self._clone(value)
+        return child
+
     def __getitem__(self, key):
         return self.__getattr__(key).value()
 
     def __getattr__(self, name):
-        new_self = self._clone()
-        if type(new_self._object) == dict and name in new_self._object.keys():
-            new_self._object = new_self._object[name]
-            return new_self
-        new_self._object = None
-        return new_self
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        if type(self._object) == dict and name in self._object.keys():
+            return self._child(name, self._object[name])
+        return self._clone(None)
 
     def __call__(self, *args, **kwargs):
         return self._object
 
     def __iter__(self):
-        # h = hash(self._object)
-        # if h not in self.iter_index:
-        #     self.iter_index[h] = 0
-        # self.iter_index[h]++
-        self.iter_index = 0
-        return self
-
-    def __next__(self):
-        try:
-            value = self._object[self.iter_index]
-        except:
-            raise StopIteration
-        self.iter_index += 1
-        new_self = self._clone()
-        new_self._object = value
-        return new_self
+        """
+        Возвращает новый итератор по элементам конфигурации. Позиция хранится в самом итераторе, поэтому
+        вложенные и одновременные обходы одного объекта конфигурации не мешают друг другу
+        """
+        index = 0
+        while True:
+            try:
+                value = self._object[index]
+            except Exception:
+                return
+            yield self._child(index, value)
+            index += 1
 
     def __repr__(self):
         return "Configurator(%s)" % yaml.dump(self._object)
@@ -359,24 +571,31 @@ class Configurator:
         if patch is None:
             return self._object
         else:
-            attr = patch.split('.')
-            value = self._object
-            for key in attr:
-                if type(value) == dict and key in value.keys():
-                    value = value[key]
-                elif type(value) == list and len(value) > int(key):
-                    value = value[int(key)]
-                else:
-                    if not with_error:
-                        new_self = self._clone()
-                        new_self._object = default
-                        return new_self
-                    else:
-                        raise KeyError('Path %s not found' % patch)
-
-            new_self = self._clone()
-            new_self._object = value
-            return new_self
+            child = self._path(patch)
+            if child is not None:
+                return child
+            if not with_error:
+                return self._clone(default)
+            raise KeyError('Path %s not found' % patch)
+
+    def _path(self, patch: str) -> typing.Any:
+        """
+        Возвращает объект конфигурации по пути из ключей и индексов, разделенных точкой, или None, если путь не
+        найден. Путь каждый раз проходится по текущим значениям, объекты найденных значений используются повторно
+
+        :param patch: путь к значению
+        :return: Configurator или None
+        """
+        child = self
+        for key in patch.split('.'):
+            value = child._object
+            if type(value) == dict and key in value.keys():
+                child = child._child(key, value[key])
+            elif type(value) == list and key.lstrip('-').isdigit() and len(value) > int(key):
+                child = child._child(int(key), value[int(key)])
+            else:
+                return None
+        return child
 
     def keys(self):
         return self._object.keys() if self._object is not None else {}
@@ -413,30 +632,15 @@ class Configurator:
 
     def get_property(self, patch, default=None):
         try:
-            attr = patch.split('.')
-            value = self._object
-            for key in attr:
-                if type(value) == dict and key in value.keys():
-                    value = value[key]
-                elif type(value) == list and len(value) > int(key):
-                    value = value[int(key)]
-                else:
-                    value = default
-                    break
-
-        except KeyError as e:
-            value = default
-            raise KeyError('Path %s not found' % patch)
+            child = self._path(patch)
         except AttributeError as e:
-            value = default
             raise KeyError('Path %s not found' % patch)
         except Exception as e:
             print('ERROR Configure', e)
-            value = None
-
-        new_self = self._clone()
-        new_self._object = value
-        return new_self
+            return self._clone(None)
+        if child is None:
+            return self._clone(default)
+        return child
 
     def value(self):
         """
@@ -1,9 +1,18 @@
 from __future__ import annotations
+import os
+import math
+import time
+import inspect
+import threading
+import contextvars
+from collections import ChainMap, deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from functools import wraps
 from typing import Optional
 from abc import ABC, abstractmethod
 from .heandler import BaseResponseHandler
 from .heandler import ResponseHandler
+from .dependency import DependencyStorage
 
 
 class BaseStrategy(ABC):
@@ -20,6 +29,117 @@ class BaseStrategy(ABC):
         pass
 
 
+class AsyncBaseStrategy(BaseStrategy):
+    """
+    Интерфейс асинхронной Стратегии. Контекст вызывает ее из `Context.aexecute`, ожидая результат,
+    поэтому один процесс может обслуживать множество одновременных запросов, ожидающих ввода-вывода.
+    """
+
+    @abstractmethod
+    async def execute(self, *args, **kwargs):
+        pass
+
+
+class LatencyRecorder:
+    """
+    Хранит последние замеры времени выполнения этапов контекста в наносекундах и считает по ним перцентили
+    """
+
+    def __init__(self, window: int = 1024, sink=None):
+        """
+        :param window: Количество последних замеров, которые хранятся для каждого этапа
+        :param sink: Функция sink(name, elapsed), вызываемая для каждого замера
+        """
+        self.window = window
+        self.sink = sink
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed):
+        """
+        Сохраняет замер
+
+        :param name: Название этапа
+        :param elapsed: Время выполнения в наносекундах
+        :return:
+        """
+        samples = self._samples.get(name)
+        if samples is None:
+            with self._lock:
+                samples = self._samples.setdefault(name, deque(maxlen=self.window))
+        samples.append(elapsed)
+        if self.sink is not None:
+            self.sink(name, elapsed)
+
+    @staticmethod
+    def percentile(values, percent):
+        """
+        Перцентиль отсортированного списка значений
+
+        :param values: Отсортированный список
+        :param percent: Перцентиль от 0 до 100
+        :return:
+        """
+        return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+    def summary(self):
+        """
+        Возвращает для каждого этапа количество замеров в окне `count`, перцентили `p50`, `p95`, `p99` и
+        максимальное значение `max` в наносекундах
+
+        :return: dict
+        """
+        with self._lock:
+            items = [(name, sorted(samples)) for name, samples in self._samples.items()]
+        return {name: {
+            'count': len(values),
+            'p50': self.percentile(values, 50),
+            'p95': self.percentile(values, 95),
+            'p99': self.percentile(values, 99),
+            'max': values[-1],
+        } for name, values in items if values}
+
+    def clear(self):
+        """
+        Удаляет все замеры
+
+        :return:
+        """
+        with self._lock:
+            self._samples = {}
+
+
+def synchronous(value, name):
+    """
+    Проверяет, что обработчик или стратегия, вызванные из синхронного `Context.execute`, не вернули awaitable.
+    Такой результат нельзя выполнить без цикла событий, поэтому корутина закрывается и вызывается исключение
+
+    :param value: Результат вызова
+    :param name: Имя обработчика или стратегии для сообщения об ошибке
+    :return: value
+    """
+    if inspect.isawaitable(value):
+        if inspect.iscoroutine(value):
+            value.close()
+        raise Exception('%s returned an awaitable in the synchronous Context.execute, '
+                        'use `await Context.aexecute()` instead' % name)
+    return value
+
+
+def execute_strategy(strategy, args, kwargs):
+    """
+    Выполняет стратегию в процессе пула `Context.map`. Класс стратегии и аргументы должны поддерживать pickle
+
+    :param strategy: Класс или объект стратегии
+    :param args: Позиционные аргументы
+    :param kwargs: Именованные аргументы
+    :return:
+    """
+    if isinstance(strategy, type):
+        strategy = strategy()
+    return synchronous(strategy.execute(*args, **kwargs), type(strategy).__qualname__)
+
+
 class Context:
     """
     Контекст определяет метод обработки входящего потока информации.
@@ -28,10 +148,6 @@ class Context:
     Что бы изменить поведение контекста нужно указать для него новую стратегию.
     """
 
-    before_start_function_list = []
-    after_start_function_list = []
-    context_function_list = []
-    _params = {}
     _instances = {}
 
     def __call__(self, *args, **kwargs):
@@ -51,11 +167,17 @@ class Context:
                  strategy: BaseStrategy,
                  options: Optional[dict] = None,
                  params: Optional[dict] = None,
-                 error_handler: Optional[BaseResponseHandler] = None) -> None:
+                 error_handler: Optional[BaseResponseHandler] = None,
+                 reuse_strategy: Optional[str] = None) -> None:
         """
         Обычно Контекст принимает стратегию через конструктор, а также
         предоставляет сеттер для её изменения во время выполнения.
+
+        :param reuse_strategy: Повторное использование объекта стратегии: None - новый объект на каждый вызов
+        `execute`, 'context' - один объект на контекст, 'thread' - один объект на поток
         """
+        if reuse_strategy not in (None, 'context', 'thread'):
+            raise Exception('Unknown strategy reuse mode %s' % reuse_strategy)
         if params is None:
             params = {}
         if options is None:
@@ -63,8 +185,20 @@ class Context:
         if error_handler is None:
             error_handler = ResponseHandler
         self._strategy = strategy
+        self._reuse_strategy = reuse_strategy
+        self._strategy_instance = None
+        self._strategy_local = threading.local()
+        self._strategy_lock = threading.Lock()
         self._error_handler = error_handler
         self._owner = None
+        self.before_start_function_list = []
+        self.after_start_function_list = []
+        self.context_function_list = []
+        self._pipeline = None
+        self._apipeline = None
+        self._latency = None
+        self._local_params = contextvars.ContextVar('context_params_%x' % id(self), default=None)
+        self._params = {}
         self._params.update(params)
         self._params.update(options)
 
@@ -93,6 +227,7 @@ class Context:
 
         def decorator(func):
             self.before_start_function_list.append(func)
+            self.reset_pipeline()
 
             @wraps(func)
             def wrapper(*args, **kwargs):
@@ -116,6 +251,7 @@ class Context:
 
         def decorator(func):
             self.after_start_function_list.append(func)
+            self.reset_pipeline()
 
             @wraps(func)
             def wrapper(*args, **kwargs):
@@ -139,6 +275,7 @@ class Context:
 
         def decorator(func):
             self.context_function_list.append(func)
+            self.reset_pipeline()
 
             @wraps(func)
             def wrapper(*args, **kwargs):
@@ -150,18 +287,278 @@ class Context:
 
         return decorator
 
+    @property
+    def params(self):
+        """
+        Параметры контекста. Во время выполнения `execute` - параметры текущего запроса поверх общих параметров,
+        иначе общие параметры
+
+        :return: ChainMap или dict
+        """
+        params = self._local_params.get()
+        if params is None:
+            return self._params
+        return params
+
+    def remove_hook(self, func):
+        """
+        Удаляет функцию из обработчиков before_start, context и after_start контекста
+
+        :param func: Функция обработчика или функция, возвращенная декоратором
+        :return:
+        """
+        func = getattr(func, '__wrapped__', func)
+        for functions in (self.before_start_function_list, self.context_function_list,
+                          self.after_start_function_list):
+            while func in functions:
+                functions.remove(func)
+        self.reset_pipeline()
+
+    def reset_pipeline(self):
+        """
+        Сбрасывает собранные цепочки вызова обработчиков, они будут собраны заново при следующем вызове
+
+        :return:
+        """
+        self._pipeline = None
+        self._apipeline = None
+
+    @property
+    def pipeline(self):
+        """
+        Цепочка вызова обработчиков before_start, context, стратегии и обработчиков after_start, привязанная к
+        контексту. Собирается один раз и пересобирается при добавлении или удалении обработчиков
+
+        :return: callable
+        """
+        pipeline = self._pipeline
+        if pipeline is None:
+            pipeline = self._pipeline = self.compile()
+        return pipeline
+
+    def enable_timings(self, window: int = 1024, sink=None):
+        """
+        Включает замер времени выполнения каждого обработчика и этапов `before_start`, `context`, `strategy`,
+        `after_start` и `total`. Пока замеры выключены, цепочка вызова собирается без них и не имеет накладных
+        расходов
+
+        :param window: Количество последних замеров, по которым считаются перцентили
+        :param sink: Функция sink(name, elapsed), вызываемая для каждого замера, время в наносекундах
+        :return:
+        """
+        self._latency = LatencyRecorder(window, sink)
+        self.reset_pipeline()
+
+    def disable_timings(self):
+        """
+        Выключает замер времени выполнения и удаляет замеры
+
+        :return:
+        """
+        self._latency = None
+        self.reset_pipeline()
+
+    def timings(self):
+        """
+        Возвращает перцентили p50, p95, p99 времени выполнения обработчиков и этапов контекста в наносекундах.
+        Обработчики называются `<этап>.<имя функции>`
+
+        :return: dict
+        """
+        if self._latency is None:
+            return {}
+        return self._latency.summary()
+
+    def compile(self):
+        """
+        Собирает цепочку вызова обработчиков контекста
+
+        :return: callable
+        """
+        if self._latency is not None:
+            return self.compile_timed()
+        before_start = tuple(self.before_start_function_list)
+        context = tuple(self.context_function_list)
+        after_start = tuple(self.after_start_function_list)
+        run = self.run
+
+        def pipeline(*args, **kwargs):
+            owner = self._owner
+            '''Запускаем обработчики before_start'''
+            for func in before_start:
+                synchronous(func(owner), func.__qualname__)
+            '''Запускаем обработчики context'''
+            for func in context:
+                synchronous(func(owner, self), func.__qualname__)
+            result = synchronous(run(*args, **kwargs), 'Strategy')
+            '''Запускаем обработчики after_start'''
+            for func in after_start:
+                synchronous(func(owner, result), func.__qualname__)
+            return result
+
+        return pipeline
+
+    def compile_timed(self):
+        """
+        Собирает цепочку вызова обработчиков контекста с замером времени выполнения
+
+        :return: callable
+        """
+        record = self._latency.record
+        now = time.perf_counter_ns
+        before_start = tuple(('before_start.' + func.__qualname__, func) for func in self.before_start_function_list)
+        context = tuple(('context.' + func.__qualname__, func) for func in self.context_function_list)
+        after_start = tuple(('after_start.' + func.__qualname__, func) for func in self.after_start_function_list)
+        run = self.run
+
+        def pipeline(*args, **kwargs):
+            owner = self._owner
+            start = now()
+            for name, func in before_start:
+                begin = now()
+                synchronous(func(owner), name)
+                record(name, now() - begin)
+            phase = now()
+            record('before_start', phase - start)
+            for name, func in context:
+                begin = now()
+                synchronous(func(owner, self), name)
+                record(name, now() - begin)
+            begin = now()
+            record('context', begin - phase)
+            result = synchronous(run(*args, **kwargs), 'Strategy')
+            phase = now()
+            record('strategy', phase - begin)
+            for name, func in after_start:
+                begin = now()
+                synchronous(func(owner, result), name)
+                record(name, now() - begin)
+            end = now()
+            record('after_start', end - phase)
+            record('total', end - start)
+            return result
+
+        return pipeline
+
+    @property
+    def apipeline(self):
+        """
+        Асинхронная цепочка вызова обработчиков и стратегии для `aexecute`
+
+        :return: Корутинная функция
+        """
+        pipeline = self._apipeline
+        if pipeline is None:
+            pipeline = self._apipeline = self.acompile()
+        return pipeline
+
+    def acompile(self):
+        """
+        Собирает асинхронную цепочку вызова обработчиков контекста. Обработчики могут быть как обычными функциями,
+        так и корутинными, результат корутинных обработчиков ожидается
+
+        :return: Корутинная функция
+        """
+        if self._latency is not None:
+            return self.acompile_timed()
+        before_start = tuple(self.before_start_function_list)
+        context = tuple(self.context_function_list)
+        after_start = tuple(self.after_start_function_list)
+        arun = self.arun
+
+        async def pipeline(*args, **kwargs):
+            owner = self._owner
+            '''Запускаем обработчики before_start'''
+            for func in before_start:
+                value = func(owner)
+                if inspect.isawaitable(value):
+                    await value
+            '''Запускаем обработчики context'''
+            for func in context:
+                value = func(owner, self)
+                if inspect.isawaitable(value):
+                    await value
+            result = await arun(*args, **kwargs)
+            '''Запускаем обработчики after_start'''
+            for func in after_start:
+                value = func(owner, result)
+                if inspect.isawaitable(value):
+                    await value
+            return result
+
+        return pipeline
+
+    def acompile_timed(self):
+        """
+        Собирает асинхронную цепочку вызова обработчиков контекста с замером времени выполнения.
+        Время корутинных обработчиков и стратегии включает ожидание их результата
+
+        :return: Корутинная функция
+        """
+        record = self._latency.record
+        now = time.perf_counter_ns
+        before_start = tuple(('before_start.' + func.__qualname__, func) for func in self.before_start_function_list)
+        context = tuple(('context.' + func.__qualname__, func) for func in self.context_function_list)
+        after_start = tuple(('after_start.' + func.__qualname__, func) for func in self.after_start_function_list)
+        arun = self.arun
+
+        async def pipeline(*args, **kwargs):
+            owner = self._owner
+            start = now()
+            for name, func in before_start:
+                begin = now()
+                value = func(owner)
+                if inspect.isawaitable(value):
+                    await value
+                record(name, now() - begin)
+            phase = now()
+            record('before_start', phase - start)
+            for name, func in context:
+                begin = now()
+                value = func(owner, self)
+                if inspect.isawaitable(value):
+                    await value
+                record(name, now() - begin)
+            begin = now()
+            record('context', begin - phase)
+            result = await arun(*args, **kwargs)
+            phase = now()
+            record('strategy', phase - begin)
+            for name, func in after_start:
+                begin = now()
+                value = func(owner, result)
+                if inspect.isawaitable(value):
+                    await value
+                record(name, now() - begin)
+            end = now()
+            record('after_start', end - phase)
+            record('total', end - start)
+            return result
+
+        return pipeline
+
     def add_param(self, key, value):
-        if self._params.get(key, False):
+        params = self.params
+        if params.get(key, False):
             raise Exception('Parameter %s already exists', key)
-        self._params[key] = value
+        params[key] = value
 
     def set_param(self, key, value):
-        self._params[key] = value
+        """
+        Устанавливает параметр. Внутри `execute` (в обработчиках и стратегии) параметр устанавливается только для
+        текущего запроса и не виден одновременно выполняющимся запросам
+
+        :param key: Ключ параметра
+        :param value: Значение
+        :return:
+        """
+        self.params[key] = value
 
     def param(self, key):
-        if not self._params.get(key, False):
+        params = self.params
+        if not params.get(key, False):
             raise Exception('Parameter %s not found' % key)
-        return self._params[key]
+        return params[key]
 
     @property
     def strategy(self) -> BaseStrategy:
@@ -178,25 +575,231 @@ class Context:
         Обычно Контекст позволяет заменить объект Стратегии во время выполнения.
         """
         self._strategy = strategy
+        self._strategy_instance = None
+        self._strategy_local = threading.local()
+
+    def strategy_instance(self) -> BaseStrategy:
+        """
+        Возвращает объект стратегии для вызова с учетом режима `reuse_strategy`.
+        Если вместо класса стратегии установлен ее объект, он используется для всех вызовов
+
+        :return: BaseStrategy
+        """
+        strategy = self._strategy
+        if not isinstance(strategy, type):
+            return strategy
+        if self._reuse_strategy == 'context':
+            instance = self._strategy_instance
+            if instance is None:
+                with self._strategy_lock:
+                    if self._strategy_instance is None:
+                        self._strategy_instance = strategy()
+                    instance = self._strategy_instance
+            return instance
+        if self._reuse_strategy == 'thread':
+            local = self._strategy_local
+            instance = getattr(local, 'instance', None)
+            if instance is None:
+                instance = local.instance = strategy()
+            return instance
+        return strategy()
+
+    def run(self, *args, **kwargs):
+        """
+        Вызывает стратегию с параметрами контекста, без обработчиков
+
+        :return:
+        """
+        strategy = self.strategy_instance()
+        kwargs.update(self._params)
+        local = self._local_params.get()
+        if local is not None:
+            kwargs.update(local.maps[0])
+        kwargs.update({'container': self._owner})
+        return strategy.execute(*args, error_handler=self._error_handler, **kwargs)
+
+    async def arun(self, *args, **kwargs):
+        """
+        Вызывает стратегию с параметрами контекста без обработчиков, ожидая результат асинхронной стратегии
+
+        :return:
+        """
+        result = self.run(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
 
     def execute(self, *args, **kwargs) -> str:
         """
         Вместо того, что-бы самостоятельно реализовывать множественные версии
         алгоритма, Контекст делегирует некоторую работу объекту Стратегии.
+        Каждый вызов открывает свою область жизни SCOPED зависимостей и свой слой параметров, который хранится в
+        contextvars и поэтому изолирован между потоками и задачами asyncio. Если стратегия или обработчик вернули
+        awaitable, вызывается исключение, такие контексты выполняются через `aexecute`.
         """
+        params_token = self._local_params.set(ChainMap({}, self._params))
+        token = DependencyStorage.enter_scope()
+        try:
+            return self.pipeline(*args, **kwargs)
+        finally:
+            DependencyStorage.exit_scope(token)
+            self._local_params.reset(params_token)
+
+    async def aexecute(self, *args, **kwargs):
+        """
+        Асинхронный вариант `execute` для ASGI и asyncio серверов. Обработчики и стратегия могут быть корутинными
+        (`AsyncBaseStrategy`), обычные вызываются напрямую. Слой параметров и область жизни SCOPED зависимостей
+        создаются для каждой задачи asyncio.
+        """
+        params_token = self._local_params.set(ChainMap({}, self._params))
+        token = DependencyStorage.enter_scope()
+        try:
+            return await self.apipeline(*args, **kwargs)
+        finally:
+            DependencyStorage.exit_scope(token)
+            self._local_params.reset(params_token)
+
+    def start(self):
+        """
+        Запускает обработчики before_start и context в отдельном слое параметров
 
-        '''Запускаем обработчики before_start'''
-        for func in self.before_start_function_list:
-            func(self._owner)
-        '''Запускаем обработчики context'''
-        for func in self.context_function_list:
-            func(self._owner, self)
+        :return: dict параметров для стратегии
+        """
+        token = self._local_params.set(ChainMap({}, self._params))
+        try:
+            owner = self._owner
+            for func in self.before_start_function_list:
+                synchronous(func(owner), func.__qualname__)
+            for func in self.context_function_list:
+                synchronous(func(owner, self), func.__qualname__)
+            return dict(self._local_params.get())
+        finally:
+            self._local_params.reset(token)
+
+    def finish(self, result):
+        """
+        Запускает обработчики after_start
 
-        strategy = self.strategy()
-        kwargs.update(self._params)
-        kwargs.update({'container': self._owner})
-        result = strategy.execute(*args, error_handler=self._error_handler, **kwargs)
-        '''Запускаем обработчики after_start'''
+        :param result: Результат стратегии
+        :return:
+        """
         for func in self.after_start_function_list:
-            func(self._owner, result)
-        return result
+            synchronous(func(self._owner, result), func.__qualname__)
+
+    def map(self, items, *args, workers: Optional[int] = None, pool='thread', ordered: bool = True,
+            return_exceptions: bool = False, hooks: str = 'item', **kwargs):
+        """
+        Выполняет стратегию для каждого элемента `items` в пуле потоков или процессов. Элемент передается стратегии
+        первым позиционным аргументом, за ним `args` и `kwargs`. Одновременно выполняется не более `workers`
+        элементов, остальные берутся из `items` по мере освобождения пула.
+
+        В пуле процессов стратегии не передается `container`, а класс стратегии, элементы и параметры должны
+        поддерживать pickle. Обработчики всегда выполняются в текущем процессе.
+
+        :param items: Итерируемый объект с входными данными
+        :param workers: Количество одновременно выполняемых элементов, по умолчанию количество процессоров
+        :param pool: 'thread', 'process' или объект concurrent.futures.Executor
+        :param ordered: Возвращать результаты в порядке элементов, иначе по мере готовности
+        :param return_exceptions: Возвращать исключение элемента вместо результата, иначе исключение прерывает
+        выполнение
+        :param hooks: 'item' - обработчики выполняются для каждого элемента, 'batch' - один раз: before_start и
+        context до первого элемента, after_start со списком всех результатов
+        :return: Итератор результатов
+        """
+        if hooks not in ('item', 'batch'):
+            raise Exception('Unknown hooks mode %s' % hooks)
+        if not isinstance(pool, Executor) and pool not in ('thread', 'process'):
+            raise Exception('Unknown pool %s' % pool)
+        workers = workers or os.cpu_count() or 1
+        process = pool == 'process' or isinstance(pool, ProcessPoolExecutor)
+        if isinstance(pool, Executor):
+            executor = pool
+        elif process:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        return self._map(executor, executor is not pool, process, items, args, kwargs, workers, ordered,
+                         return_exceptions, hooks)
+
+    def execute_many(self, items, *args, **kwargs) -> list:
+        """
+        Выполняет стратегию для каждого элемента `items` и возвращает список результатов, параметры как у `map`
+
+        :param items: Итерируемый объект с входными данными
+        :return: list
+        """
+        return list(self.map(items, *args, **kwargs))
+
+    def _map(self, executor, owned, process, items, args, kwargs, workers, ordered, return_exceptions, hooks):
+        params = self.start() if hooks == 'batch' else None
+
+        def call(item):
+            token = DependencyStorage.enter_scope()
+            try:
+                values = dict(kwargs, **params)
+                values.update({'container': self._owner})
+                strategy = self.strategy_instance()
+                return synchronous(strategy.execute(item, *args, error_handler=self._error_handler, **values),
+                                   type(strategy).__qualname__)
+            finally:
+                DependencyStorage.exit_scope(token)
+
+        def submit(item):
+            if process:
+                values = dict(kwargs, **(params if params is not None else self.start()))
+                values['error_handler'] = self._error_handler
+                return executor.submit(execute_strategy, self._strategy, (item,) + args, values)
+            # Каждый элемент выполняется в копии контекста вызывающего кода, чтобы в поток пула попали
+            # переопределения зависимостей и параметры контекста
+            run = contextvars.copy_context().run
+            if params is None:
+                return executor.submit(run, self.execute, item, *args, **kwargs)
+            return executor.submit(run, call, item)
+
+        def collect(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+            if process and params is None:
+                self.finish(result)
+            return result
+
+        iterator = iter(items)
+        pending = deque() if ordered else set()
+        results = [] if params is not None else None
+
+        def fill():
+            while len(pending) < workers:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                if ordered:
+                    pending.append(submit(item))
+                else:
+                    pending.add(submit(item))
+
+        try:
+            fill()
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    pending.difference_update(done)
+                values = [collect(future) for future in done]
+                fill()
+                for value in values:
+                    if results is not None:
+                        results.append(value)
+                    yield value
+            if results is not None:
+                self.finish(results)
+        finally:
+            for future in pending:
+                future.cancel()
+            if owned:
+                executor.shutdown(wait=True)
@@ -1,12 +1,67 @@
 from __future__ import annotations
+import time
 import inspect
+import typing
+import threading
+import contextvars
+from contextlib import contextmanager
 from functools import wraps
 
 
+SINGLETON = 'singleton'
+SCOPED = 'scoped'
+TRANSIENT = 'transient'
+
+_scope = contextvars.ContextVar('dependency_scope', default=None)
+_overrides = contextvars.ContextVar('dependency_overrides', default=None)
+_missing = object()
+
+
+class DependencyException(Exception):
+    """
+    Исключение при разрешении зависимостей
+
+    """
+    pass
+
+
+class DependencyCycleException(DependencyException):
+    """
+    Исключение - зависимости ссылаются друг на друга по кругу
+
+    """
+    pass
+
+
+class OverrideLayer:
+    """ Слой переопределений зависимостей текущего потока или задачи asyncio поверх общего хранилища.
+        Слой не изменяется после создания, каждое переопределение создает новый слой
+    """
+
+    def __init__(self, parent=None, storages=None, lifetimes=None, lazy=None):
+        self.storages = dict(parent.storages) if parent is not None else {}
+        self.lifetimes = dict(parent.lifetimes) if parent is not None else {}
+        self.lazy = dict(parent.lazy) if parent is not None else {}
+        self.storages.update(storages or {})
+        self.lifetimes.update(lifetimes or {})
+        self.lazy.update(lazy or {})
+        self.plans = {}
+        self.version = None
+
+
 class DependencyStorage:
     _storages = {}
     _history = {}
+    _lifetimes = {}
+    _lazy = {}
+    _singletons = {}
+    _plans = {}
+    _interfaces = {}
     _instances = {}
+    _version = 0
+    _stats = None
+    _stats_hook = None
+    _lock = threading.RLock()
 
     def __call__(cls, *args, **kwargs):
         """
@@ -22,11 +77,19 @@ class DependencyStorage:
             cls._instances[cls] = instance
         return cls._instances[cls]
 
-    def add(self, dependency, inject, *args, **kwargs):
+    def add(self, dependency, inject, *args, lifetime=None, lazy=None, **kwargs):
         """ Добавляет в хранилище зависимостей информацию о новой зависимости.
             Если зависимость уже присутствует в хранилище и аргументов не передано тогда происходит замена
             зависимости на новую, но с тем же интерфейсом.
+
+            :param lifetime: Время жизни объекта зависимости: SINGLETON - один объект на процесс, SCOPED - один
+            объект на запрос (вызов Context.execute), TRANSIENT - новый объект при каждом запросе зависимости.
+            При замене зависимости без указания сохраняется прежнее значение
+            :param lazy: Возвращать вместо объекта LazyDependency, который создаст объект при первом обращении.
+            При замене зависимости без указания сохраняется прежнее значение
         """
+        if lifetime not in (None, SINGLETON, SCOPED, TRANSIENT):
+            raise Exception('Unknown lifetime %s of the dependency %s' % (lifetime, dependency.__name__))
         if dependency.__name__ not in self._storages:
             self._storages[dependency.__name__] = (inject, args, kwargs)
             self._history[dependency.__name__] = []
@@ -36,15 +99,78 @@ class DependencyStorage:
             self._history[dependency.__name__].append(inject)
         else:
             raise Exception('Attempt to update the dependency %s with replacement of input data' % dependency.__name__)
-
-    def rollback(self, dependency):
+        if lifetime is not None:
+            self._lifetimes[dependency.__name__] = lifetime
+        if lazy is not None:
+            self._lazy[dependency.__name__] = lazy
+        self._interfaces[dependency.__name__] = dependency
+        self.invalidate()
+
+    def rollback(self, dependency, inject=None, settings=None):
+        """ Отменяет последнюю замену зависимости в общем хранилище.
+
+            :param inject: Отменить замену, только если последней установлена эта зависимость
+            :param settings: Время жизни и признак отложенного создания, которые нужно восстановить, см. settings()
+        """
         if dependency.__name__ not in self._storages:
             return False
-        self._history[dependency.__name__].pop()
+        history = self._history[dependency.__name__]
+        if inject is not None and (len(history) < 2 or history[-1] is not inject):
+            return False
+        history.pop()
+        if settings is not None:
+            for values, value in zip((self._lifetimes, self._lazy), settings):
+                if value is None:
+                    values.pop(dependency.__name__, None)
+                else:
+                    values[dependency.__name__] = value
         inject = self._history[dependency.__name__][-1]
         self._storages[dependency.__name__] = self.construct(dependency, inject)
+        self.invalidate()
         return True
 
+    def settings(self, dependency):
+        """ Возвращает время жизни и признак отложенного создания зависимости в общем хранилище """
+        return self._lifetimes.get(dependency.__name__), self._lazy.get(dependency.__name__)
+
+    def invalidate(self):
+        """ Сбрасывает скомпилированные планы разрешения после изменения общего хранилища """
+        DependencyStorage._version += 1
+        self._plans.clear()
+
+    def override(self, dependency, inject, *args, lifetime=None, lazy=None, **kwargs):
+        """ Переопределяет зависимость только для текущего потока или задачи asyncio, не изменяя общее хранилище.
+            Без аргументов сохраняются аргументы действующей зависимости.
+            Возвращает токен для reset
+
+            :param lifetime: Время жизни объекта зависимости, по умолчанию как у действующей зависимости
+            :param lazy: Создавать объект при первом обращении, по умолчанию как у действующей зависимости
+        """
+        if lifetime not in (None, SINGLETON, SCOPED, TRANSIENT):
+            raise Exception('Unknown lifetime %s of the dependency %s' % (lifetime, dependency.__name__))
+        storage = self.storage(dependency)
+        if storage is None or len(args) > 0 or len(kwargs) > 0:
+            storage = (inject, args, kwargs)
+        else:
+            storage = (inject, storage[1], storage[2])
+        lifetimes = {dependency.__name__: lifetime} if lifetime is not None else None
+        lazy = {dependency.__name__: lazy} if lazy is not None else None
+        return _overrides.set(OverrideLayer(_overrides.get(), {dependency.__name__: storage}, lifetimes, lazy))
+
+    @staticmethod
+    def reset(token):
+        """ Отменяет переопределение зависимости, сделанное override """
+        _overrides.reset(token)
+
+    def storage(self, dependency):
+        """ Возвращает действующую зависимость (фабрику, аргументы) с учетом переопределений или None """
+        layer = _overrides.get()
+        if layer is not None:
+            storage = layer.storages.get(dependency.__name__)
+            if storage is not None:
+                return storage
+        return self._storages.get(dependency.__name__)
+
     def construct(self, dependency, inject):
         if dependency.__name__ not in self._storages:
             return False
@@ -54,19 +180,335 @@ class DependencyStorage:
             self._storages[dependency.__name__][2]
         )
 
+    def lifetime(self, dependency):
+        """ Возвращает время жизни объекта зависимости с учетом переопределений """
+        layer = _overrides.get()
+        if layer is not None and dependency.__name__ in layer.lifetimes:
+            return layer.lifetimes[dependency.__name__]
+        return self._lifetimes.get(dependency.__name__, TRANSIENT)
+
+    def lazy(self, dependency):
+        """ Возвращает признак отложенного создания объекта зависимости с учетом переопределений """
+        layer = _overrides.get()
+        if layer is not None and dependency.__name__ in layer.lazy:
+            return layer.lazy[dependency.__name__]
+        return self._lazy.get(dependency.__name__, False)
+
     def get(self, dependency):
         """ Возвращает из хранилища зависимостей информацию о выбранной зависимости """
-        if dependency.__name__ not in self._storages:
+        if self.storage(dependency) is None:
             raise Exception('Dependency %s not found' % dependency.__name__)
+        if self.lazy(dependency):
+            # Объект создается позже, поэтому переопределения и область жизни берутся на момент запроса
+            context = contextvars.copy_context()
+            return LazyDependency(lambda: context.run(self.instance, dependency))
+        return self.instance(dependency)
+
+    def instance(self, dependency):
+        """ Возвращает объект зависимости с учетом времени его жизни.
+            Зависимости, которые объект получает через аннотации конструктора, создаются по заранее
+            скомпилированному плану
+        """
+        pending, values = self.pending(dependency)
+        for interface, injections in pending:
+            storage = self.storage(interface)
+            injected = {name: values[item.__name__] for name, item in injections}
+            lifetime = self.lifetime(interface)
+            cache = self.cache(lifetime)
+            if cache is None:
+                value = self.create(interface, storage, injected)
+            elif lifetime == SINGLETON:
+                with self._lock:
+                    key = (interface.__name__, storage[0])
+                    if key not in cache:
+                        cache[key] = self.create(interface, storage, injected)
+                    elif self._stats is not None:
+                        self.record(interface)
+                    value = cache[key]
+            else:
+                value = cache.get((interface.__name__, storage[0]), _missing)
+                if value is _missing:
+                    value = cache.setdefault((interface.__name__, storage[0]), self.create(interface, storage, injected))
+            values[interface.__name__] = value
+        return values[dependency.__name__]
+
+    def create(self, dependency, storage, injected=None):
+        """ Создает объект зависимости при синхронном разрешении.
+            :raises DependencyException: фабрика зависимости асинхронная, результат не сохраняется
+        """
+        value = self.build(dependency, storage, injected)
+        if inspect.isawaitable(value):
+            if inspect.iscoroutine(value):
+                value.close()
+            raise DependencyException('Dependency %s has an async factory, resolve it with `await '
+                                      'Dependency.aresolve()` or `inject` on a coroutine function' % dependency.__name__)
+        return value
+
+    async def aget(self, dependency):
+        """ Возвращает объект зависимости, дожидаясь асинхронных фабрик (`async def` или возвращающих awaitable).
+            Асинхронная фабрика SINGLETON зависимости может быть вызвана повторно при одновременном первом запросе,
+            сохраняется первый созданный объект
+        """
+        if self.storage(dependency) is None:
+            raise Exception('Dependency %s not found' % dependency.__name__)
+        pending, values = self.pending(dependency)
+        for interface, injections in pending:
+            storage = self.storage(interface)
+            start = time.perf_counter_ns() if self._stats is not None else None
+            value = self.build(interface, storage, {name: values[item.__name__] for name, item in injections})
+            if inspect.isawaitable(value):
+                value = await value
+                if start is not None:
+                    self.record(interface, time.perf_counter_ns() - start)
+            cache = self.cache(self.lifetime(interface))
+            if cache is not None:
+                value = cache.setdefault((interface.__name__, storage[0]), value)
+            values[interface.__name__] = value
+        return values[dependency.__name__]
+
+    def cache(self, lifetime):
+        """ Возвращает хранилище объектов для времени жизни или None, если объекты не сохраняются """
+        if lifetime == SINGLETON:
+            return self._singletons
+        if lifetime == SCOPED:
+            return _scope.get()
+        return None
+
+    def cached(self, dependency):
+        """ Возвращает сохраненный объект зависимости или _missing """
+        cache = self.cache(self.lifetime(dependency))
+        if cache is None:
+            return _missing
+        return cache.get((dependency.__name__, self.storage(dependency)[0]), _missing)
+
+    def pending(self, dependency):
+        """ Возвращает шаги плана, которые нужно выполнить, и уже сохраненные объекты зависимостей.
+            Зависимости сохраненного объекта не создаются, общая TRANSIENT зависимость создается один раз на
+            разрешение
+        """
+        values = {}
+        needed = {dependency.__name__}
+        pending = []
+        for interface, injections in reversed(self.plan(dependency)):
+            if interface.__name__ not in needed:
+                continue
+            value = self.cached(interface)
+            if value is not _missing:
+                values[interface.__name__] = value
+                if self._stats is not None:
+                    self.record(interface)
+                continue
+            pending.append((interface, injections))
+            needed.update(item.__name__ for _, item in injections)
+        pending.reverse()
+        return pending, values
+
+    def plan(self, dependency):
+        """ Возвращает план разрешения зависимости: зависимости в порядке их создания вместе с аргументами,
+            которые нужно им передать. План компилируется один раз и сбрасывается при изменении хранилища
+        """
+        plans = self._plans
+        layer = _overrides.get()
+        if layer is not None:
+            if layer.version != DependencyStorage._version:
+                layer.plans = {}
+                layer.version = DependencyStorage._version
+            plans = layer.plans
+        plan = plans.get(dependency.__name__)
+        if plan is None:
+            steps = []
+            self.compile(dependency, steps, [], set())
+            plan = tuple(steps)
+            plans[dependency.__name__] = plan
+        return plan
+
+    def compile(self, dependency, steps, path, done):
+        """ Обходит граф зависимостей в глубину, добавляя зависимости в план после всех, от которых они зависят """
+        if dependency.__name__ in done:
+            return
+        if dependency.__name__ in path:
+            cycle = path[path.index(dependency.__name__):] + [dependency.__name__]
+            raise DependencyCycleException('Dependency cycle detected: %s' % ' -> '.join(cycle))
+        if self.storage(dependency) is None:
+            raise Exception('Dependency %s not found' % dependency.__name__)
+        path.append(dependency.__name__)
+        injections = self.injections(dependency)
+        for _, interface in injections:
+            self.compile(interface, steps, path, done)
+        path.pop()
+        done.add(dependency.__name__)
+        steps.append((dependency, injections))
+
+    def injections(self, dependency):
+        """ Находит аргументы конструктора зависимости, аннотированные зарегистрированными интерфейсами и не
+            переданные при установке зависимости
+        """
+        inject, args, kwargs = self.storage(dependency)
+        try:
+            params = inspect.signature(inject).parameters
+        except (TypeError, ValueError):
+            return ()
+        try:
+            hints = typing.get_type_hints(inject.__init__ if inspect.isclass(inject) else inject)
+        except Exception:
+            hints = {}
+        injections = []
+        for i, (name, param) in enumerate(params.items()):
+            if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+                continue
+            if (i < len(args) and param.kind is not inspect.Parameter.KEYWORD_ONLY) or name in kwargs:
+                continue
+            if param.default is not inspect.Parameter.empty and param.default is not None:
+                continue
+            annotation = hints.get(name, param.annotation)
+            if inspect.isclass(annotation) and self.storage(annotation) is not None:
+                injections.append((name, annotation))
+        return tuple(injections)
+
+    def validate(self):
+        """ Компилирует планы всех зависимостей, что бы обнаружить циклы при запуске приложения
+            :raises DependencyCycleException: найден цикл зависимостей
+        """
+        for name in list(self._interfaces):
+            self.plan(self._interfaces[name])
 
+    def build(self, dependency, storage, injected=None):
+        """ Создает объект зависимости """
+        start = time.perf_counter_ns() if self._stats is not None else None
         try:
-            return self._storages[dependency.__name__][0](
-                *self._storages[dependency.__name__][1],
-                **self._storages[dependency.__name__][2]
-            )
+            if injected:
+                value = storage[0](*storage[1], **dict(storage[2], **injected))
+            else:
+                value = storage[0](*storage[1], **storage[2])
         except Exception as e:
             print("Dependency %s not founded" % dependency.__name__)
             raise e
+        if start is not None and not inspect.isawaitable(value):
+            self.record(dependency, time.perf_counter_ns() - start)
+        return value
+
+    @staticmethod
+    def enable_stats(hook=None):
+        """ Включает сбор статистики разрешения зависимостей.
+            Пока статистика выключена, ее сбор не добавляет накладных расходов
+
+            :param hook: Функция hook(interface, elapsed), вызываемая при каждом разрешении зависимости.
+            elapsed - время создания объекта в наносекундах или None, если объект взят из хранилища
+        """
+        with DependencyStorage._lock:
+            if DependencyStorage._stats is None:
+                DependencyStorage._stats = {}
+            DependencyStorage._stats_hook = hook
+
+    @staticmethod
+    def disable_stats():
+        """ Выключает сбор статистики разрешения зависимостей и удаляет собранные данные """
+        DependencyStorage._stats = None
+        DependencyStorage._stats_hook = None
+
+    def record(self, dependency, elapsed=None):
+        """ Учитывает разрешение зависимости в статистике
+
+            :param dependency: Интерфейс зависимости
+            :param elapsed: Время создания объекта в наносекундах или None, если объект взят из хранилища
+        """
+        stats = self._stats
+        if stats is None:
+            return
+        with self._lock:
+            item = stats.get(dependency.__name__)
+            if item is None:
+                item = stats[dependency.__name__] = {'resolutions': 0, 'builds': 0, 'hits': 0, 'time': 0, 'max_time': 0}
+            item['resolutions'] += 1
+            if elapsed is None:
+                item['hits'] += 1
+            else:
+                item['builds'] += 1
+                item['time'] += elapsed
+                if elapsed > item['max_time']:
+                    item['max_time'] = elapsed
+        hook = DependencyStorage._stats_hook
+        if hook is not None:
+            hook(dependency, elapsed)
+
+    def stats(self):
+        """ Возвращает статистику разрешения зависимостей по интерфейсам: количество разрешений `resolutions`,
+            созданий объекта `builds`, взятий из хранилища `hits`, суммарное `time` и максимальное `max_time` время
+            создания в наносекундах. Если сбор статистики выключен, возвращается пустой словарь
+
+            :return: dict
+        """
+        stats = self._stats
+        if stats is None:
+            return {}
+        with self._lock:
+            return {name: dict(item) for name, item in stats.items()}
+
+    @staticmethod
+    def enter_scope():
+        """ Открывает область жизни SCOPED зависимостей для текущего потока или задачи asyncio.
+            Возвращает токен для exit_scope
+        """
+        return _scope.set({})
+
+    @staticmethod
+    def exit_scope(token):
+        """ Закрывает область жизни SCOPED зависимостей, открытую enter_scope """
+        _scope.reset(token)
+
+    @staticmethod
+    @contextmanager
+    def scope():
+        """ Область жизни SCOPED зависимостей
+        Пример:
+        ```
+        with DependencyStorage.scope():
+            assert Dependency.resolve(TestInterface) is Dependency.resolve(TestInterface)
+        ```
+        """
+        token = DependencyStorage.enter_scope()
+        try:
+            yield
+        finally:
+            DependencyStorage.exit_scope(token)
+
+
+class LazyDependency:
+    """ Заместитель объекта зависимости, который создает объект при первом обращении к его атрибутам """
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_target', _missing)
+
+    def resolve(self):
+        """ Возвращает объект зависимости, создавая его при первом вызове """
+        target = object.__getattribute__(self, '_target')
+        if target is _missing:
+            with object.__getattribute__(self, '_lock'):
+                target = object.__getattribute__(self, '_target')
+                if target is _missing:
+                    target = object.__getattribute__(self, '_factory')()
+                    object.__setattr__(self, '_target', target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        target = object.__getattribute__(self, '_target')
+        if target is _missing:
+            return "<LazyDependency (unresolved)>"
+        return repr(target)
 
 
 def inject(*drugs, progressive=True):
@@ -111,23 +553,36 @@ def inject(*drugs, progressive=True):
     """
     def decorator(func):
         ds = DependencyStorage()
+        params = inspect.signature(func).parameters
+        if progressive is True:
+            injections = tuple((name, param.annotation) for name, param in params.items()
+                               if param.annotation is not inspect._empty
+                               and param.annotation in drugs
+                               and (param.default is inspect._empty or param.default is None))
+        else:
+            injections = tuple((name, param.default.dependency) for name, param in params.items()
+                               if isinstance(param.default, Dependency))
 
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            signature = inspect.signature(func)
-            params = signature.parameters
-            if progressive is True:
-                for name, param in params.items():
-                    if param.annotation is not inspect._empty \
-                            and param.annotation in drugs \
-                            and (param.default is inspect._empty or param.default is None) \
-                            and name not in kwargs:
-                        kwargs[name] = ds.get(param.annotation)
-            else:
-                for name, param in params.items():
-                    if isinstance(param.default, Dependency):
-                        kwargs[name] = ds.get(param.default.dependency)
-            return func(*args, **kwargs)
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                for name, interface in injections:
+                    if progressive is not True or name not in kwargs:
+                        kwargs[name] = await ds.aget(interface)
+                return await func(*args, **kwargs)
+        elif progressive is True:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                for name, interface in injections:
+                    if name not in kwargs:
+                        kwargs[name] = ds.get(interface)
+                return func(*args, **kwargs)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                for name, interface in injections:
+                    kwargs[name] = ds.get(interface)
+                return func(*args, **kwargs)
 
         wrapper.__name__ = func.__name__
         wrapper.__doc__ = func.__doc__
@@ -143,15 +598,22 @@ class Dependency:
 
     _storages = {}
 
-    def __init__(self, dependency, *args, **kwargs) -> None:
+    def __init__(self, dependency, *args, lifetime=None, lazy=None, **kwargs) -> None:
         """
         Обычно Контекст принимает стратегию через конструктор, а также
         предоставляет сеттер для её изменения во время выполнения.
+
+        :param lifetime: Время жизни объекта зависимости SINGLETON, SCOPED или TRANSIENT
+        :param lazy: Создавать объект зависимости при первом обращении к нему
         """
         self._owner = None
+        self._replaced = None
+        self._token = None
         if len(args) > 0:
             ds = DependencyStorage()
-            ds.add(dependency, args[0], *args[1:], **kwargs)
+            if dependency.__name__ in ds._storages:
+                self._replaced = (args[0], lifetime, lazy, ds.settings(dependency))
+            ds.add(dependency, args[0], *args[1:], lifetime=lifetime, lazy=lazy, **kwargs)
         self._dependency = dependency
 
     def __set_name__(self, owner, name):
@@ -175,7 +637,7 @@ class Dependency:
         return self._dependency
 
     @staticmethod
-    def init(interface, *args, **kwargs):
+    def init(interface, *args, lifetime=None, lazy=None, **kwargs):
         """ Устанавливает зависимость для класса или функции
 
         Пример:
@@ -199,7 +661,7 @@ class Dependency:
 
         def decorator(func):
             ds = DependencyStorage()
-            ds.add(interface, func, *args, **kwargs)
+            ds.add(interface, func, *args, lifetime=lifetime, lazy=lazy, **kwargs)
 
             @wraps(func)
             def wrapper(*args, **kwargs):
@@ -253,11 +715,36 @@ class Dependency:
 
         return decorator
 
+    @staticmethod
+    @contextmanager
+    def override(interface, inject, *args, lifetime=None, **kwargs):
+        """ Переопределяет зависимость только внутри блока with для текущего потока или задачи asyncio.
+            Общее хранилище не изменяется, поэтому одновременные запросы и тесты не влияют друг на друга
+
+        Пример:
+            ```
+            with Dependency.override(TestInterface, TestDependency) as di:
+                assert Dependency.resolve(TestInterface).test() == di.test()
+            ```
+        """
+        ds = DependencyStorage()
+        token = ds.override(interface, inject, *args, lifetime=lifetime, **kwargs)
+        try:
+            yield ds.get(interface)
+        finally:
+            ds.reset(token)
+
     @staticmethod
     def resolve(interface):
         ds = DependencyStorage()
         return ds.get(interface)
 
+    @staticmethod
+    async def aresolve(interface):
+        """ Разрешает зависимость с асинхронной фабрикой """
+        ds = DependencyStorage()
+        return await ds.aget(interface)
+
     def __get__(self, instance, owner):
         """ Возвращаем зависимость при обращении к объекту """
         ds = DependencyStorage()
@@ -279,7 +766,10 @@ class Dependency:
         return "%s object at %s is dependency %s" % (self.__class__, id(self), dep.__class__)
 
     def __enter__(self):
-        """ Метод для входа в контекст
+        """ Метод для входа в контекст.
+        Замена уже установленной зависимости переносится из общего хранилища в слой переопределений текущего потока
+        или задачи asyncio, поэтому вместе с lifetime и lazy действует только внутри блока with и не видна
+        одновременным запросам
         Пример:
         ```
         with Dependency(TestAppInterface, TestApp1) as di:
@@ -287,10 +777,19 @@ class Dependency:
         ```
         """
         ds = DependencyStorage()
+        if self._replaced is not None and self._token is None:
+            inject, lifetime, lazy, settings = self._replaced
+            if settings is not None:
+                # Замена, записанная конструктором, убирается из общего хранилища один раз
+                ds.rollback(self._dependency, inject, settings)
+                self._replaced = (inject, lifetime, lazy, None)
+            self._token = ds.override(self._dependency, inject, lifetime=lifetime, lazy=lazy)
         dep = ds.get(self._dependency)
         return dep
 
     def __exit__(self, exc_type, exc_value, traceback):
         """ Вызывается при выходе из контекста with """
         ds = DependencyStorage()
-        ds.rollback(self._dependency)
+        if self._token is not None:
+            ds.reset(self._token)
+            self._token = None
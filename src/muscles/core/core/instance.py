@@ -109,7 +109,11 @@ class ApplicationMeta(type):
         if cls not in cls._instances:
             instance = super(ApplicationMeta, cls).__call__(*args, **kwargs)
             if not hasattr(instance, '_initialized'):
-                instance.initialize(*args, **kwargs)
+                initialize = getattr(instance, 'initialize', None)
+                if initialize is None:
+                    cls.initialize(instance, *args, **kwargs)
+                else:
+                    initialize(*args, **kwargs)
                 instance._initialized = True
             cls._instances[cls] = instance
         return cls._instances[cls]
@@ -11,11 +11,22 @@ from .swagger import *
 from .group import *
 from .security import *
 from .itinerary import *
+from .static import *
+from .binder import *
 from .user import *
 
 __all__ = (
     "Itinerary",
     "Node",
+    "BaseRule",
+    "DefaultRule",
+    "VarRule",
+    "IntRule",
+    "FloatRule",
+    "UUIDRule",
+    "StaticHandler",
+    "StaticFile",
+    "ArgumentBinder",
     "BaseSecurity",
     "BasicAuthSecurity",
     "ApiKeyAuthSecurity",
@@ -0,0 +1,163 @@
+import inspect
+
+from ..exceptions import RequestErrorException
+from .exception import ValidationColumnException
+from .parameters import BaseParameter
+from .field import BigInteger, Float, Double, Numeric, Boolean
+
+
+def to_boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_converter(param_type):
+    """
+    Возвращает функцию преобразования строкового значения параметра в тип поля схемы
+
+    :param param_type: Поле схемы параметра
+    :return: callable или None, если значение остается строкой
+    """
+    if isinstance(param_type, BigInteger):
+        return int
+    if isinstance(param_type, (Float, Double, Numeric)):
+        return float
+    if isinstance(param_type, Boolean):
+        return to_boolean
+    return None
+
+
+class ArgumentBinder:
+    """
+    Связывает аргументы обработчика маршрута с данными запроса.
+    Формируется один раз при регистрации обработчика по его сигнатуре и схеме параметров `PathParameter`,
+    `QueryParameter`, `HeaderParameter` и `CookieParameter`. При вызове извлекает, преобразует и проверяет только те
+    аргументы, которые обработчик принимает и которые описаны в схеме, являются параметрами маршрута или `request`.
+    Сам роутер обработчик не вызывает: серверный слой получает `handler.binder` у найденного маршрута и передает в
+    `bind` запрос и параметры из `Itinerary.get_current_route`
+    """
+
+    def __init__(self, func, parameters=None, path_params=None):
+        """
+        :param func: Обработчик маршрута
+        :param parameters: Параметр или список параметров схемы обработчика
+        :param path_params: Названия параметров маршрута
+        """
+        if parameters is None:
+            parameters = []
+        elif isinstance(parameters, BaseParameter):
+            parameters = [parameters]
+        schema = {}
+        for parameter in parameters:
+            if isinstance(parameter, BaseParameter):
+                schema.setdefault(parameter.name, parameter)
+
+        path_params = frozenset(path_params or ())
+        params = dict(inspect.signature(func).parameters)
+        if self.is_method(func) and params:
+            first = next(iter(params.values()))
+            if first.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD):
+                del params[first.name]
+        names = [name for name, param in params.items()
+                 if param.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)
+                 and (name in schema or name == 'request' or name in path_params)]
+        if any(param.kind is inspect.Parameter.VAR_KEYWORD for param in params.values()):
+            names += [name for name in schema if name not in params]
+
+        steps = []
+        for name in names:
+            parameter = schema.get(name)
+            if name == 'request' and parameter is None:
+                steps.append((name, 'request', (), None, None))
+                continue
+            source = parameter.destination if parameter is not None and parameter.destination else 'path'
+            if source == 'header':
+                keys = (name, name.lower(), 'HTTP_' + name.upper().replace('-', '_'))
+            elif source == 'path' and name != name.lower():
+                # Узлы роутера хранят названия параметров маршрута в нижнем регистре
+                keys = (name, name.lower())
+            else:
+                keys = (name,)
+            converter = get_converter(parameter.param_type) if parameter is not None else None
+            steps.append((name, source, keys, parameter, converter))
+        self.steps = tuple(steps)
+
+    @staticmethod
+    def is_method(func):
+        """
+        Проверяет, что обработчик - функция, объявленная в классе, первый аргумент которой получает объект класса
+
+        :param func: Обработчик маршрута
+        :return: bool
+        """
+        if inspect.ismethod(func):
+            return False
+        parts = getattr(func, '__qualname__', '').split('.')
+        return len(parts) > 1 and parts[-2] != '<locals>'
+
+    def bind(self, request=None, path=None, query=None, headers=None, cookies=None, form=None):
+        """
+        Формирует аргументы вызова обработчика
+
+        :param request: Объект запроса
+        :param path: Параметры маршрута
+        :param query: Параметры строки запроса
+        :param headers: Заголовки запроса
+        :param cookies: Cookie запроса
+        :param form: Данные формы
+        :return: dict
+        :raises RequestErrorException: обязательный параметр не передан или не прошел проверку
+        """
+        sources = {'path': path, 'query': query, 'header': headers, 'cookie': cookies, 'formData': form}
+        kwargs = {}
+        for name, source, keys, parameter, converter in self.steps:
+            if source == 'request':
+                if request is not None:
+                    kwargs[name] = request
+                continue
+            values = sources.get(source)
+            value = None
+            if values:
+                for key in keys:
+                    value = values.get(key)
+                    if value is not None:
+                        break
+            if isinstance(value, (list, tuple)) and len(value) == 0:
+                value = None
+            if value is None:
+                if parameter is not None and parameter.required:
+                    raise RequestErrorException(status=400, reason='The `%s` parameter is required' % name)
+                continue
+            if parameter is not None:
+                value = self.convert(name, parameter, converter, value)
+            kwargs[name] = value
+        return kwargs
+
+    @staticmethod
+    def convert(name, parameter, converter, value):
+        """
+        Преобразует и проверяет значение параметра по схеме
+
+        :param name: Название параметра
+        :param parameter: Параметр схемы
+        :param converter: Функция преобразования значения
+        :param value: Значение
+        :return:
+        """
+        multiple = getattr(parameter, 'multiple', False)
+        if isinstance(value, (list, tuple)):
+            values = list(value) if multiple else value[:1]
+        else:
+            values = [value]
+        try:
+            if converter is not None:
+                values = [converter(item) for item in values]
+            if hasattr(parameter.param_type, 'validate'):
+                for item in values:
+                    parameter.param_type.validate(item, field=name)
+        except (TypeError, ValueError) as e:
+            raise RequestErrorException(status=400, reason='The `%s` parameter is invalid: %s' % (name, e))
+        except ValidationColumnException as e:
+            raise RequestErrorException(status=400, reason=e.message)
+        return values if multiple else values[0]
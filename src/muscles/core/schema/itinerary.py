@@ -2,13 +2,19 @@ import inspect
 import re
 import os
 import traceback
-from functools import wraps
+import threading
+import uuid
+from collections import OrderedDict
+from functools import wraps, lru_cache
 from abc import ABC
-from urllib.parse import unquote
+from urllib.parse import quote, unquote
 
 from ..exceptions import ApplicationException, AccessDeniedException
 from .schema import Schema
 from .security import BaseSecurity
+from .parameters import BaseParameter
+from .static import StaticHandler
+from .binder import ArgumentBinder
 from .user import GuestUser
 
 
@@ -22,6 +28,171 @@ HTTP_METHOD_OPTION = 'options'
 HTTP_METHOD_TRACE = 'trace'
 HTTP_METHOD_CONNECT = 'connect'
 
+ROUTE_PARAMETER_PATTERN = re.compile(r"\{([^\}]+)\}")
+
+
+class RouteSegment:
+    """
+    Разобранная часть шаблона маршрута между символами `/`
+    """
+
+    def __init__(self, chunk):
+        """
+        :param chunk: Часть шаблона маршрута, например `user`, `{id:int}` или `post-{slug}`
+        """
+        self.chunk = chunk
+        self.parts = []
+        position = 0
+        for m in ROUTE_PARAMETER_PATTERN.finditer(chunk):
+            if m.start() > position:
+                self.parts.append(chunk[position:m.start()])
+            param = m.group(1).split(':')
+            self.parts.append((param[0], param[1] if len(param) > 1 else 'var'))
+            position = m.end()
+        if position < len(chunk):
+            self.parts.append(chunk[position:])
+        params = [part for part in self.parts if not isinstance(part, str)]
+        if params:
+            self.name, self.rule = params[0]
+            self.route = '{%s:%s}' % (self.name, self.rule)
+        else:
+            self.name = None
+            self.rule = 'default'
+            self.route = chunk
+
+    @property
+    def is_parameter(self):
+        """
+        Является ли часть маршрута параметром
+        :return:
+        """
+        return self.name is not None
+
+
+@lru_cache(maxsize=None)
+def parse_segment(chunk):
+    """
+    Разбирает часть шаблона маршрута, результат кешируется
+
+    :param chunk: Часть шаблона маршрута
+    :return: RouteSegment
+    """
+    return RouteSegment(chunk)
+
+
+@lru_cache(maxsize=None)
+def parse_route(route):
+    """
+    Разбирает шаблон маршрута на части, результат кешируется
+
+    :param route: Шаблон маршрута
+    :return: tuple(RouteSegment)
+    """
+    return tuple(parse_segment(chunk) for chunk in route.split('/'))
+
+
+class BaseRule:
+    """
+    Базовое правило части маршрута.
+    Правило проверяет и преобразует значение за один проход методом `convert`, несовпадение обозначается
+    исключением ValueError
+    """
+
+    name = None
+
+    def convert(self, path):
+        """
+        Преобразует значение части пути
+
+        :param path: Часть пути
+        :return:
+        :raises ValueError: значение не подходит правилу
+        """
+        return path
+
+    def is_match(self, path, route):
+        """
+        Проверяет совпадает ли часть пути с правилом
+
+        :param path: Часть пути
+        :param route: Адрес узла
+        :return: bool
+        """
+        try:
+            self.convert(unquote(path))
+        except ValueError:
+            return False
+        return True
+
+    def compile(self, value):
+        """
+        Формирует часть ссылки из значения
+
+        :param value: Значение параметра
+        :return: str
+        """
+        return quote(str(value), safe='')
+
+
+class DefaultRule(BaseRule):
+    """
+    Правило статической части маршрута
+    """
+
+    name = 'default'
+
+    def is_match(self, path, route):
+        return path.lower() == route
+
+
+class VarRule(BaseRule):
+    """
+    Правило строкового параметра
+    """
+
+    name = 'var'
+
+    def convert(self, path):
+        if path == '':
+            raise ValueError('Empty value')
+        return path
+
+
+class IntRule(BaseRule):
+    """
+    Правило целочисленного параметра
+    """
+
+    name = 'int'
+
+    def convert(self, path):
+        if not path.isdigit():
+            raise ValueError('Value %s is not an integer' % path)
+        return int(path)
+
+
+class FloatRule(BaseRule):
+    """
+    Правило параметра с плавающей точкой
+    """
+
+    name = 'float'
+
+    def convert(self, path):
+        return float(path)
+
+
+class UUIDRule(BaseRule):
+    """
+    Правило параметра UUID
+    """
+
+    name = 'uuid'
+
+    def convert(self, path):
+        return uuid.UUID(path)
+
+
 class Itinerary:
     """
     Базовый класс для работы с роутами
@@ -34,19 +205,21 @@ class Itinerary:
     # nodes_map = []
     # static_map = []
     error_handler_map = []
+    _error_handlers = None
     rules = []
     node = None
     _instances = {}
 
     set_response = {}
 
-    def __new__(cls, *args, prefix=None, version=None, name=None, **kwargs):
+    def __new__(cls, *args, prefix=None, version=None, name=None, cache_size=None, **kwargs):
         """
         Создает синглтон объект роутера, формирует первую ноду роутера
         :param args:
         :param prefix: префикс роутера
         :param version: Версия роутера
         :param name: Название роутера
+        :param cache_size: Размер кеша разрешения маршрутов, по умолчанию кеш отключен
         :param kwargs:
         """
         instance_name = (cls, name)
@@ -56,6 +229,12 @@ class Itinerary:
             cls._instances[instance_name].prefix = prefix
             cls._instances[instance_name].nodes_map = []
             cls._instances[instance_name].static_map = []
+            cls._instances[instance_name]._nodes_index = set()
+            cls._instances[instance_name]._matcher = None
+            cls._instances[instance_name]._dispatch = None
+            cls._instances[instance_name]._url_builders = {}
+            cls._instances[instance_name]._static_table = StaticTable()
+            cls._instances[instance_name]._route_cache = RouteCache(cache_size) if cache_size else None
         return cls._instances[instance_name]
 
     def __init__(self, *args, **kwargs):
@@ -104,6 +283,8 @@ class Itinerary:
         :return:
         """
         self.rules.append(rule)
+        for instance in self._instances.values():
+            instance._url_builders = {}
 
     def to_url(self, route_key, params):
         """
@@ -113,20 +294,40 @@ class Itinerary:
         :param params: Параметры
         :return:
         """
-        l = []
+        builder = self.url_builder(route_key)
+        return builder.build(params) if builder is not None else ''
 
-        def repl(m):
-            name = m.group(3) if m.group(3) else 'var'
-            for rule in self.rules:
-                if rule.name == name:
-                    return rule.compile(params.get(m.group(2), ''))
+    def to_urls(self, items):
+        """
+        Формирует список ссылок за один вызов
 
-        for r in self.nodes_map:
-            if r['key'] == route_key:
-                rs = r['route'].split('/')
-                for s in rs:
-                    l.append(re.sub(r"(\{([\w\d\%\_\-]+)\:?([\w\d\%\_\-]+)?\})", repl, s))
-        return '/'.join(l)
+        :param items: Последовательность пар (ключ маршрута, параметры)
+        :return: list
+        """
+        builders = self._url_builders
+        urls = []
+        for route_key, params in items:
+            builder = builders.get(route_key)
+            if builder is None:
+                builder = self.url_builder(route_key)
+            urls.append(builder.build(params) if builder is not None else '')
+        return urls
+
+    def url_builder(self, route_key):
+        """
+        Возвращает скомпилированный построитель ссылки для ключа маршрута
+
+        :param route_key: Ключ маршрута
+        :return: UrlBuilder
+        """
+        builder = self._url_builders.get(route_key)
+        if builder is None:
+            for r in self.nodes_map:
+                if r['key'] == route_key:
+                    builder = UrlBuilder(r['route'], self.rules)
+                    self._url_builders[route_key] = builder
+                    break
+        return builder
 
     def match(self, url):
         """
@@ -135,55 +336,37 @@ class Itinerary:
         :param url: Ссылка
         :return:
         """
-        if url == '/':
-            url = '/main'
-        chunks = url.split('/')
-        if len(chunks) > 0 and chunks[0] == '':
-            chunks = chunks[1:]
-        route = self.node
-        routes = []
-        _find_routes = self._match(route, chunks)
-        for _route in _find_routes:
-            for item in self.nodes_map:
-                if item['key'] == _route.key:
-                    routes.append(_route)
-        return routes[0] if len(routes) > 0 else None
-
-    def _match(self, route, chunks, paths=[], n=0):
-        """
-        Поиск подходящих узлов
-
-        :param route:
-        :param chunks:
-        :param paths:
-        :param n:
-        :return:
+        return self.match_with_params(url)[0]
+
+    @property
+    def matcher(self):
         """
-        for node in route.childrens:
-            if node.is_match(chunks[:1][0]):
-                if len(chunks[1:]) == 0:
-                    yield node
-                else:
-                    yield from self._match(node, chunks[1:], [node] + paths, n + 1)
+        Скомпилированное дерево маршрутов. Пересобирается только после изменения дерева методом add
+
+        :return: RouteMatcher
+        """
+        matcher = self._matcher
+        if matcher is None:
+            matcher = RouteMatcher(self.node, [item['key'] for item in self.nodes_map])
+            self._matcher = matcher
+        return matcher
 
     def match_with_params(self, url):
         """
-        Возвращает подходящий маршрут с параметрами
+        Возвращает подходящий маршрут с параметрами.
+        Значения параметров уже преобразованы правилами узлов, например `{id:int}` вернет int
 
         :param url: УРЛ
         :return:
         """
+        if url == '/':
+            url = '/main'
         chunks = url.split('/')
-        node = self.match(url)
-        if node is None:
+        if len(chunks) > 0 and chunks[0] == '':
+            chunks = chunks[1:]
+        if len(chunks) == 0:
             return None, {}
-        _node = node
-        dictionary = {}
-        for chunk in chunks[::-1]:
-            if _node.dictionary_key:
-                dictionary.update(_node.dictionary(chunk))
-            _node = _node.parent
-        return node, dictionary
+        return self.matcher.match_with_params(chunks)
 
     def add_static(self, directory: str, prefix: str = None, handler=None, full_path: bool = False):
         """
@@ -191,18 +374,23 @@ class Itinerary:
 
         :param directory: Директория фалов
         :param prefix: Префик для маршрута
-        :param handler: Обработчик маршрута
+        :param handler: Обработчик маршрута, по умолчанию встроенный StaticHandler
         :param bool full_path: Полуный путь маршрута
         :return:
         """
         for c in self.static_map:
             if directory == c['directory'] and prefix == c['prefix']:
                 raise Exception('Route must have unique `prefix` [%s] and `route` [%s] values' % (prefix, directory))
-        self.static_map.append({
-            "directory": directory if full_path else os.path.join(os.getcwd(), directory),
+        directory = directory if full_path else os.path.join(os.getcwd(), directory)
+        if handler is None:
+            handler = StaticHandler(directory, prefix=prefix)
+        static = {
+            "directory": directory,
             "prefix": prefix,
             'handler': handler,
-        })
+        }
+        self.static_map.append(static)
+        self._static_table.add(prefix, static)
 
     def static(self, directory: str, prefix: str = None, full_path: bool = False):
         """
@@ -229,21 +417,14 @@ class Itinerary:
 
     def get_current_static(self, request):
         """
-        Возвращает обработчик статических файлов
+        Возвращает обработчик статических файлов.
+        Выбирается обработчик с самым длинным совпавшим префиксом, обработчики без префикса используются только если
+        ни один префикс не совпал
 
         :param request: Объект запроса
         :return:
         """
-
-        def condition(route):
-            '''condition here'''
-            res = True
-            if res and route['prefix'] and not request.path.lower().startswith(route['prefix'] + '/'.lower()):
-                res = False
-            return res
-
-        filtered = [static for static in self.static_map if condition(static)]
-        return filtered[0] if len(filtered) > 0 else None
+        return self._static_table.find(request.path)
 
     def _trigger_set_handler(self, handler, *args, **kwargs):
         handler.is_action = kwargs.get('is_action', False)
@@ -289,9 +470,8 @@ class Itinerary:
         route = '/'.join([i for i in route.split('/') if i != ''])
 
         chunks = route.split('/')
-        for c in self.nodes_map:
-            if route == c['route'] and content_type == c['content_type'] and key == c['key'] and method == c['method']:
-                raise Exception('The router must have a unique sequence `key` [%s], `content_type` [%s], `method` ['
+        if (key, route, method, content_type) in self._nodes_index:
+            raise Exception('The router must have a unique sequence `key` [%s], `content_type` [%s], `method` ['
                                 '%s], `route` [%s]',
                                 key, content_type, method, route)
 
@@ -303,42 +483,22 @@ class Itinerary:
             key = '.'.join(tuple(chunks[1:] if chunks[0] == '' else chunks))
         _key, key = key, None
         _handler, handler = handler, None
-        _chunks = []
-        for chunk in chunks:
-            _chunks.append(chunk)
+        last = len(chunks) - 1
+        for i, segment in enumerate(parse_route(route)):
+            chunk = segment.chunk
             if chunk == '':
                 continue
-            m = re.search(r"\{([^\}]+)\}", chunk)
-            if m:
-                m = m.group(1).split(':')
-                dictionary_key = m[0]
-                rule = m[1] if len(m) > 1 else 'var'
-            else:
-                dictionary_key = False
-                rule = 'default'
+            dictionary_key = segment.name if segment.is_parameter else False
+            rule = segment.rule
             for _rule in self.rules:
                 if _rule.name == rule:
                     rule = _rule
                     break
-            if '/'.join(_chunks) == '/'.join(chunks):
+            if i == last:
                 key = _key
                 handler = _handler
-
-                def condition(nm, key=None, route=None, method=None, content_type=None):
-                    res = True
-                    if res and nm['key'] != key:
-                        res = False
-                    if res and nm['route'] != route:
-                        res = False
-                    if res and nm['method'] != method:
-                        res = False
-                    if res and nm['content_type'] != content_type:
-                        res = False
-                    return res
-
-                nm_find = [nm for nm in self.nodes_map if condition(nm, key=key, route=route, method=method,
-                                                                    content_type=content_type)]
-                if len(nm_find) == 0:
+                if (key, route, method, content_type) not in self._nodes_index:
+                    self._nodes_index.add((key, route, method, content_type))
                     self.nodes_map.append({
                         "key": key,
                         "route": route,
@@ -349,8 +509,15 @@ class Itinerary:
                         'instance': self,
                     })
             node = node.instance(chunk, full_route=full_route, key=key, dictionary_key=dictionary_key, rule=rule)
+        self._matcher = None
+        self._dispatch = None
+        self._url_builders = {}
+        if self._route_cache is not None:
+            self._route_cache.clear()
         handler.node = node
         handler.full_route = full_route
+        handler.binder = ArgumentBinder(handler, getattr(handler, 'parameters', None),
+                                        [segment.name for segment in parse_route(route) if segment.is_parameter])
 
         if method == '*' and handler is not None and handler.__name__ in self.legal_http_method:
             handler.method = handler.__name__
@@ -442,7 +609,8 @@ class Itinerary:
         return decorator
 
     def action(self, *args, route=None, key=None, module=None, method=None, content_type=None,
-               redirect: str = None, model: Schema = None, security: list[BaseSecurity, str] = None, **kwargs):
+               redirect: str = None, model: Schema = None, security: list[BaseSecurity, str] = None,
+               parameters: list[BaseParameter] = None, **kwargs):
         """
         Регистрация "действия" для контроллера.
         Внимание: Работает только совместно с регистрацией контроллера с помощью метода controller
@@ -455,6 +623,7 @@ class Itinerary:
         :param content_type: Тип контента маршрута
         :param redirect: Редирект, для маршрута
         :param security: Необходимость и способ авторизации
+        :param parameters: Параметры обработчика, по ним формируется ArgumentBinder
         :return:
         """
 
@@ -466,6 +635,7 @@ class Itinerary:
             kwargs['content_type'] = content_type
             kwargs['model'] = model
             kwargs['security'] = security
+            kwargs['parameters'] = parameters
             kwargs['is_action'] = True
             func = self._trigger_set_handler(func, *args, **kwargs)
 
@@ -478,19 +648,22 @@ class Itinerary:
             func.content_type = content_type
             func.redirect = redirect
             func.route = route or '/'
+            func.parameters = parameters
             if model:
                 func.model = model
 
+            params = inspect.signature(func).parameters
+            accepted = frozenset(params.keys())
+            accepts_kwargs = any(param.kind is inspect.Parameter.VAR_KEYWORD for param in params.values())
+
             @wraps(func)
             def wrapper(*args, **kwargs):
                 # validate(instance={"name": "Eggs", "price": 34.99}, schema=schema)
                 if "request" in kwargs and len(func.security) > 0 and isinstance(kwargs["request"].user, GuestUser):
                     raise AccessDeniedException(reason="Access Denied")
                 else:
-                    signature = inspect.signature(func)
-                    params = signature.parameters
-                    unreliable = list(set(kwargs.keys()) - set(params.keys()))
-                    if len(unreliable) > 0:
+                    if not accepts_kwargs and not accepted.issuperset(kwargs):
+                        unreliable = list(kwargs.keys() - accepted)
                         raise ApplicationException(status=500,
                                                    reason="The `%s` handler has no mandatory `%s` arguments" % (
                                                        func.__name__,
@@ -509,25 +682,41 @@ class Itinerary:
         """
         Добавляет функцию обработки ошибки
 
-        :param code: Код ошибки
+        :param code: Код ошибки или класс исключения, None для обработчика по умолчанию
         :param handler: функция обработки ошибки
         :return:
         """
-        for c in self.error_handler_map:
-            if code == c['code']:
-                raise Exception('Error Handler must have unique `code` [%s]' % (code))
+        if code in self.error_handlers()[0]:
+            raise Exception('Error Handler must have unique `code` [%s]' % (code))
         if handler is None:
             raise Exception('Error Handler must have `handler`')
-        self.error_handler_map.append({
+        error_handler = {
             "code": code,
             "handler": handler,
-        })
+        }
+        self.error_handler_map.append(error_handler)
+
+    def error_handlers(self):
+        """
+        Возвращает индекс обработчиков ошибок `error_handler_map` по коду и кеш поиска обработчика по классу
+        исключения. Индекс привязан к списку обработчиков роутера и собирается заново при его изменении
+
+        :return: (dict, dict)
+        """
+        handlers = self.error_handler_map
+        state = self._error_handlers
+        if state is None or state[0] is not handlers or state[1] != len(handlers):
+            index = {}
+            for handler in handlers:
+                index.setdefault(handler['code'], handler)
+            state = self._error_handlers = (handlers, len(handlers), index, {})
+        return state[2], state[3]
 
     def error_handler(self, code=None):
         """
         Декоратор функции ошибки
 
-        :param code: Код ошибки, который эта функция будет обрабатывать
+        :param code: Код ошибки или класс исключения, который эта функция будет обрабатывать
         :return:
         """
 
@@ -551,43 +740,104 @@ class Itinerary:
         :param request: Объект запроса
         :return:
         """
+        cache = self._route_cache
+        if cache is not None:
+            cache_key = (request.path, request.method, request.content_type)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached[0], dict(cached[1])
         node, dictionary = self.match_with_params(request.path)
         if node is None:
             return None, ()
+        route = self.dispatch(node.key, request.method, request.content_type)
+        if cache is not None:
+            cache.set(cache_key, (route, dictionary))
+            dictionary = dict(dictionary)
+        return route, dictionary
 
-        def condition(route):
-            """condition here"""
-            res = True
-            if res and route['key'] and route['key'] != node.key:
-                res = False
-            if res and route['method'] and route['method'] != '*' and route['method'].upper() != request.method.upper():
-                res = False
-            if res and route['content_type'] and route['content_type'] != '*/*' and \
-                    route['content_type'].lower() != request.content_type.lower():
-                res = False
-            return res
-
-        filtered = [route for route in self.nodes_map if condition(route)]
-        return filtered[0] if len(filtered) > 0 else None, dictionary
-
-    def get_current_error_handler(self, error):
+    def set_cache_size(self, cache_size=None):
         """
-        Возвращает функцию обработки ошибки
+        Включает кеш разрешения маршрутов заданного размера, при пустом значении отключает его
 
-        :param error: код ошибки
+        :param cache_size: Размер кеша
         :return:
         """
+        self._route_cache = RouteCache(cache_size) if cache_size else None
+
+    def cache_info(self):
+        """
+        Возвращает статистику кеша разрешения маршрутов
+
+        :return: dict
+        """
+        if self._route_cache is None:
+            return None
+        return self._route_cache.info()
 
-        def condition(handler):
-            """condition here"""
-            res = True
-            if res and (handler['code'] is None or handler['code'] != error.status):
-                res = False
-            return res
+    def dispatch(self, key, method=None, content_type=None):
+        """
+        Находит маршрут по ключу узла, методу и типу контента.
+        Маршруты без метода или с `*` и без типа контента или с `*/*` подходят для любого запроса, при нескольких
+        подходящих маршрутах выбирается первый зарегистрированный
+
+        :param key: Ключ узла
+        :param method: Метод запроса
+        :param content_type: Тип контента запроса
+        :return: dict
+        """
+        index = self.dispatch_index
+        method = method.upper() if method else ''
+        content_type = content_type.lower() if content_type else ''
+        found = None
+        for _key in ((key, method, content_type), (key, method, '*/*'), (key, '*', content_type), (key, '*', '*/*')):
+            item = index.get(_key)
+            if item is not None and (found is None or item[0] < found[0]):
+                found = item
+        return found[1] if found is not None else None
 
-        filtered_default = [handler for handler in self.error_handler_map if handler['code'] is None]
-        filtered = [handler for handler in self.error_handler_map if condition(handler)]
-        return filtered[0] if len(filtered) > 0 else filtered_default[0] if len(filtered_default) > 0 else None
+    @property
+    def dispatch_index(self):
+        """
+        Индекс маршрутов по ключу узла, методу и типу контента. Пересобирается только после изменения маршрутов
+        методом add
+
+        :return: dict
+        """
+        index = self._dispatch
+        if index is None:
+            index = {}
+            for position, route in enumerate(self.nodes_map):
+                method = route['method'].upper() if route['method'] and route['method'] != '*' else '*'
+                content_type = route['content_type'].lower() \
+                    if route['content_type'] and route['content_type'] != '*/*' else '*/*'
+                index.setdefault((route['key'], method, content_type), (position, route))
+            self._dispatch = index
+        return index
+
+    def get_current_error_handler(self, error):
+        """
+        Возвращает функцию обработки ошибки.
+        Сначала ищется обработчик по коду ошибки `error.status`, затем по классу исключения с учетом наследования и
+        в конце обработчик по умолчанию. Результат поиска по классу кешируется для каждого типа исключения
+
+        :param error: Исключение
+        :return:
+        """
+        index, cache = self.error_handlers()
+        status = getattr(error, 'status', None)
+        if status is not None:
+            handler = index.get(status)
+            if handler is not None:
+                return handler
+        error_type = type(error)
+        if error_type not in cache:
+            handler = index.get(None)
+            for cls in error_type.__mro__:
+                if cls in index:
+                    handler = index[cls]
+                    break
+            cache[error_type] = handler
+        return cache[error_type]
 
     def print_tree(self):
         """
@@ -631,20 +881,20 @@ class Node(ABC):
         :param parent: Родитель узла
         """
         self.full_route = full_route
-        m = re.search(r"\{([^\}]+)\}", chunk_route)
-        if m:
-            m = m.group(1).split(':')
-            chunk_route = '{%s:%s}' % (m[0], m[1] if len(m) > 1 else 'var')
+        segment = parse_segment(chunk_route)
+        chunk_route = segment.route
         self.key = key.lower() if key and key is not None else None
         self.route = chunk_route.lower() if chunk_route and chunk_route is not None else None
         self.rule = rule
         self.full_route = full_route.lower() if full_route and full_route is not None else None
         self.parent = parent
-        self.weight = 0 if not m else 100
+        self.weight = 100 if segment.is_parameter else 0
         self.dictionary_key = dictionary_key.lower() if dictionary_key and dictionary_key is not None else None
         self._childrens = []
+        self._childrens_index = {}
         if self.parent is not None:
             self.parent._childrens.append(self)
+            self.parent._childrens_index.setdefault(self.route, self)
 
     def get_children_node(self, chunk_route):
         """
@@ -652,10 +902,7 @@ class Node(ABC):
         :param chunk_route: Узел для поиска
         :return:
         """
-        for node in self._childrens:
-            if node.route == chunk_route.lower():
-                return node
-        return None
+        return self._childrens_index.get(chunk_route.lower())
 
     def instance(self, chunk_route, key=None, full_route=None, dictionary_key=None, rule=None):
         """
@@ -668,14 +915,12 @@ class Node(ABC):
         :param rule: Правило узла
         :return: Node
         """
-        m = re.search(r"\{([^\}]+)\}", chunk_route)
-        if m:
-            m = m.group(1).split(':')
-            chunk_route = '{%s:%s}' % (m[0], m[1] if len(m) > 1 else 'var')
-        if self.get_children_node(chunk_route):
-            if self.get_children_node(chunk_route).key is None:
-                self.get_children_node(chunk_route).key = key
-            return self.get_children_node(chunk_route)
+        chunk_route = parse_segment(chunk_route).route
+        node = self.get_children_node(chunk_route)
+        if node:
+            if node.key is None:
+                node.key = key
+            return node
         else:
             return Node(chunk_route, key=key, full_route=full_route, dictionary_key=dictionary_key,
                         rule=rule, parent=self)
@@ -688,6 +933,22 @@ class Node(ABC):
         """
         return True if self.rule.is_match(path, self.route) else False
 
+    def convert(self, path):
+        """
+        Проверяет путь правилом узла и возвращает значение параметра.
+        Правила с методом `convert` проверяют и преобразуют значение за один проход, для остальных значение
+        возвращается строкой
+
+        :param path: путь роутера
+        :return:
+        :raises ValueError: путь не совпадает с правилом узла
+        """
+        if hasattr(self.rule, 'convert'):
+            return self.rule.convert(unquote(path))
+        if not self.rule.is_match(path, self.route):
+            raise ValueError('Path %s does not match the rule of node %s' % (path, self.route))
+        return unquote(path)
+
     def dictionary(self, chunk):
         """
         Словарь запроса
@@ -713,3 +974,242 @@ class Node(ABC):
         :return:
         """
         self.parent = parent
+
+
+class StaticTable:
+    """
+    Префиксное дерево обработчиков статических файлов по частям пути.
+    Узел дерева - список [обработчик, потомки], корень хранит обработчик без префикса
+    """
+
+    def __init__(self):
+        self._root = [None, {}]
+
+    def add(self, prefix, static):
+        """
+        Добавляет обработчик для префикса, при совпадении префиксов остается первый добавленный
+
+        :param prefix: Префикс маршрута
+        :param static: Обработчик статических файлов
+        :return:
+        """
+        node = self._root
+        if prefix:
+            for chunk in prefix.lower().split('/'):
+                node = node[1].setdefault(chunk, [None, {}])
+        if node[0] is None:
+            node[0] = static
+
+    def find(self, path):
+        """
+        Находит обработчик с самым длинным префиксом пути
+
+        :param path: Путь запроса
+        :return:
+        """
+        path = path.lower()
+        node = self._root
+        found = node[0]
+        start = 0
+        end = path.find('/')
+        while end >= 0:
+            node = node[1].get(path[start:end])
+            if node is None:
+                break
+            if node[0] is not None:
+                found = node[0]
+            start = end + 1
+            end = path.find('/', start)
+        return found
+
+
+class UrlBuilder:
+    """
+    Скомпилированный построитель ссылки маршрута. Маршрут разбирается один раз на статические части и параметры
+    с уже найденными правилами
+    """
+
+    def __init__(self, route, rules):
+        """
+        :param route: Маршрут
+        :param rules: Список правил
+        """
+        _rules = {}
+        for rule in rules:
+            _rules.setdefault(rule.name, rule)
+        self.route = route
+        self._parts = []
+        for i, segment in enumerate(parse_route(route)):
+            if i > 0:
+                self._parts.append('/')
+            for part in segment.parts:
+                if not isinstance(part, str):
+                    part = (part[0], _rules.get(part[1]))
+                elif len(self._parts) > 0 and isinstance(self._parts[-1], str):
+                    part = self._parts.pop() + part
+                self._parts.append(part)
+
+    def build(self, params):
+        """
+        Формирует ссылку из параметров
+
+        :param params: Параметры
+        :return: str
+        """
+        return ''.join([part if isinstance(part, str) else part[1].compile(params.get(part[0], ''))
+                        for part in self._parts])
+
+
+class RouteCache:
+    """
+    Ограниченный LRU кеш разрешения маршрутов со счетчиками попаданий и промахов.
+    Хранит только найденные маршруты, что бы перебор несуществующих адресов не вытеснял часто используемые
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        :param maxsize: Максимальное количество записей
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Возвращает значение из кеша
+
+        :param key: Ключ
+        :return:
+        """
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Сохраняет значение в кеш, вытесняя самое давнее
+
+        :param key: Ключ
+        :param value: Значение
+        :return:
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Очищает кеш
+
+        :return:
+        """
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        """
+        Статистика кеша
+
+        :return: dict
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+
+class RouteMatcher:
+    """
+    Скомпилированное дерево маршрутов.
+    Статические части маршрута хранятся в словаре по адресу узла, параметризованные проверяются правилами в порядке
+    регистрации. Порядок обхода совпадает с порядком потомков узла, поэтому результат идентичен обходу дерева Node.
+    """
+
+    def __init__(self, node, keys):
+        """
+        :param node: Корневой узел роутера
+        :param keys: Ключи зарегистрированных маршрутов
+        """
+        self._keys = frozenset(keys)
+        self._tree = self._compile(node)
+
+    def _compile(self, node):
+        """
+        Компилирует потомков узла
+
+        :param node: Узел роутера
+        :return: tuple(dict, tuple)
+        """
+        static = {}
+        params = []
+        for index, children in enumerate(node.childrens):
+            item = (index, children, self._compile(children))
+            if children.dictionary_key:
+                params.append(item)
+            else:
+                static[children.route] = item
+        return static, tuple(params)
+
+    def match(self, chunks):
+        """
+        Находит узел по частям пути
+
+        :param chunks: Части пути
+        :return: Node
+        """
+        return self.match_with_params(chunks)[0]
+
+    def match_with_params(self, chunks):
+        """
+        Находит узел по частям пути и значения его параметров
+
+        :param chunks: Части пути
+        :return: tuple(Node, dict)
+        """
+        values = []
+        node = self._search(self._tree, chunks, 0, values)
+        if node is None:
+            return None, {}
+        dictionary = {}
+        for name, value in reversed(values):
+            dictionary[name] = value
+        return node, dictionary
+
+    def _search(self, compiled, chunks, n, values):
+        static, params = compiled
+        chunk = chunks[n]
+        found = static.get(chunk.lower())
+        for item in params:
+            if found is not None and found[0] < item[0]:
+                node = self._descend(found, chunks, n, values)
+                if node is not None:
+                    return node
+                found = None
+            try:
+                value = item[1].convert(chunk)
+            except ValueError:
+                continue
+            values.append((item[1].dictionary_key, value))
+            node = self._descend(item, chunks, n, values)
+            if node is not None:
+                return node
+            values.pop()
+        if found is not None:
+            return self._descend(found, chunks, n, values)
+        return None
+
+    def _descend(self, item, chunks, n, values):
+        if n + 1 == len(chunks):
+            return item[1] if item[1].key in self._keys else None
+        return self._search(item[2], chunks, n + 1, values)
@@ -0,0 +1,259 @@
+import os
+import mimetypes
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+
+class StaticFile:
+    """
+    Метаданные статического файла: размер, время изменения, ETag и Last-Modified.
+    Содержимое малых файлов читается один раз вместе с метаданными и отдается из памяти
+    """
+
+    def __init__(self, path, stat, content=None):
+        """
+        :param path: Полный путь к файлу
+        :param stat: Результат os.stat для файла
+        :param content: Содержимое файла, прочитанное при том же stat, или None
+        """
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.content = content
+
+    def is_fresh(self, stat):
+        """
+        Проверяет, что файл не изменился с момента чтения метаданных
+
+        :param stat: Результат os.stat для файла
+        :return: bool
+        """
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    def headers(self, content_length=True):
+        """
+        Заголовки ответа для файла
+
+        :param content_length: Добавить заголовок Content-Length
+        :return: list
+        """
+        headers = [
+            ('Content-Type', self.content_type),
+            ('ETag', self.etag),
+            ('Last-Modified', self.last_modified),
+        ]
+        if content_length:
+            headers.append(('Content-Length', str(self.size)))
+        return headers
+
+    def not_modified(self, environ):
+        """
+        Проверяет условные заголовки запроса If-None-Match и If-Modified-Since
+
+        :param environ: Окружение WSGI запроса
+        :return: bool
+        """
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags or 'W/' + self.etag in tags
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                date = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if date.tzinfo is None:
+                # Дата без часового пояса считается в UTC, как того требует HTTP
+                date = date.replace(tzinfo=timezone.utc)
+            return int(self.mtime) <= date.timestamp()
+        return False
+
+    @classmethod
+    def load(cls, path, max_size):
+        """
+        Читает метаданные файла и, если файл не больше max_size, его содержимое из одного открытого дескриптора,
+        поэтому размер и ETag всегда соответствуют содержимому
+
+        :param path: Полный путь к файлу
+        :param max_size: Максимальный размер файла, содержимое которого хранится в памяти
+        :return: StaticFile
+        """
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            content = None
+            if stat.st_size <= max_size:
+                content = f.read()
+                if len(content) != stat.st_size:
+                    stat = os.fstat(f.fileno())
+        return cls(path, stat, content)
+
+
+class FileIterator:
+    """
+    Итератор тела ответа, читающий файл блоками. Используется когда сервер не предоставляет wsgi.file_wrapper
+    """
+
+    def __init__(self, file, block_size):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.block_size)
+        if data:
+            return data
+        raise StopIteration
+
+    def close(self):
+        self.file.close()
+
+
+class StaticHandler:
+    """
+    Встроенный WSGI обработчик статических файлов.
+    Кеширует метаданные файлов с проверкой по os.stat, формирует ETag и Last-Modified, отвечает 304 на условные
+    запросы. Малые файлы отдаются из памяти без чтения с диска, остальные через wsgi.file_wrapper сервера или блоками
+    """
+
+    block_size = 64 * 1024
+    memory_max_size = 64 * 1024
+
+    def __init__(self, directory: str, prefix: str = None, cache_size: int = 1024, memory_max_size: int = None):
+        """
+        :param directory: Директория файлов
+        :param prefix: Префикс маршрута, который отбрасывается от пути запроса
+        :param cache_size: Количество файлов в кеше метаданных
+        :param memory_max_size: Максимальный размер файла, содержимое которого хранится в памяти
+        """
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix.rstrip('/').lower() if prefix else None
+        self.cache_size = cache_size
+        if memory_max_size is not None:
+            self.memory_max_size = memory_max_size
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, path):
+        """
+        Возвращает полный путь к файлу внутри директории или None, если путь выходит за ее пределы или содержит
+        нулевой байт
+
+        :param path: Путь запроса
+        :return: str
+        """
+        if '\x00' in path:
+            return None
+        if self.prefix and path.lower().startswith(self.prefix + '/'):
+            path = path[len(self.prefix) + 1:]
+        full_path = os.path.realpath(os.path.join(self.directory, path.lstrip('/')))
+        if full_path != self.directory and not full_path.startswith(self.directory + os.sep):
+            return None
+        return full_path
+
+    def resolve(self, path):
+        """
+        Возвращает метаданные файла из кеша, перечитывая их если файл изменился
+
+        :param path: Путь запроса
+        :return: StaticFile
+        """
+        full_path = self.path(path)
+        if full_path is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        if not os.path.isfile(full_path):
+            return None
+        with self._lock:
+            static = self._files.get(full_path)
+            if static is not None and static.is_fresh(stat):
+                self._files.move_to_end(full_path)
+                return static
+        try:
+            static = StaticFile.load(full_path, self.memory_max_size)
+        except OSError:
+            return None
+        with self._lock:
+            self._files[full_path] = static
+            if len(self._files) > self.cache_size:
+                self._files.popitem(last=False)
+        return static
+
+    def open(self, static):
+        """
+        Открывает большой файл для отдачи. Если файл изменился после чтения метаданных, метаданные перечитываются,
+        что бы Content-Length соответствовал телу ответа
+
+        :param static: Метаданные файла
+        :return: (StaticFile, file) или (None, None), если файл удален
+        """
+        try:
+            file = open(static.path, 'rb')
+        except OSError:
+            return None, None
+        stat = os.fstat(file.fileno())
+        if static.is_fresh(stat):
+            return static, file
+        static = StaticFile(static.path, stat)
+        with self._lock:
+            self._files[static.path] = static
+        return static, file
+
+    def body(self, static, environ, file=None):
+        """
+        Формирует тело ответа без чтения файла целиком
+
+        :param static: Метаданные файла
+        :param environ: Окружение WSGI запроса
+        :param file: Открытый файл для файлов, содержимое которых не хранится в памяти
+        :return: Итерируемое тело ответа
+        """
+        if static.content is not None:
+            return [static.content]
+        if file is None:
+            file = open(static.path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(file, self.block_size)
+        return FileIterator(file, self.block_size)
+
+    def __call__(self, environ, start_response):
+        """
+        Обрабатывает WSGI запрос к статическому файлу
+
+        :param environ: Окружение WSGI запроса
+        :param start_response: Функция начала ответа
+        :return: Итерируемое тело ответа
+        """
+        method = environ.get('REQUEST_METHOD', 'GET').upper()
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+            return []
+        static = self.resolve(environ.get('PATH_INFO', ''))
+        if static is None:
+            start_response('404 Not Found', [('Content-Type', 'text/plain'), ('Content-Length', '9')])
+            return [b'Not Found']
+        if static.not_modified(environ):
+            start_response('304 Not Modified', static.headers(content_length=False))
+            return []
+        file = None
+        if method != 'HEAD' and static.content is None:
+            static, file = self.open(static)
+            if static is None:
+                start_response('404 Not Found', [('Content-Type', 'text/plain'), ('Content-Length', '9')])
+                return [b'Not Found']
+        start_response('200 OK', static.headers())
+        if method == 'HEAD':
+            return []
+        return self.body(static, environ, file)
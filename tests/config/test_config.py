@@ -1,6 +1,8 @@
 import sys
 import os
+import yaml
 from ...src.muscles.core.core import Configurator
+from ...src.muscles.core.core import SecretStorage, SecretBackend, FileSecretBackend, EnvironSecretBackend, VaultSecretBackend
 
 sys.path.append(f"../")
 
@@ -15,3 +17,79 @@ def test_config_1():
     assert str(config.acl.get('api.permission')) == 'nobody'
     assert dict(config.acl) == {'api': {'permission': 'nobody'}}
     assert repr(config.acl.api) == "Configurator(permission: nobody\n)"
+
+
+def test_config_views():
+    assert config.acl.api is config.acl.api
+    assert config.get('acl.api.permission') is config.acl.get('api.permission')
+    assert config.get('acl.missing', default='none').value() == 'none'
+    assert config.acl.missing.value() is None
+    assert config.get_property('acl.api.permission').value() == 'nobody'
+
+    local = Configurator(obj={'db': {'host': 'localhost'}, 'hosts': ['a', 'b']})
+    assert [str(host) for host in local.hosts] == ['a', 'b']
+    assert [(str(first), str(second)) for first in local.hosts for second in local.hosts] == \
+        [('a', 'a'), ('a', 'b'), ('b', 'a'), ('b', 'b')]
+    iterator = iter(local.hosts)
+    assert [str(host) for host in local.hosts] == ['a', 'b']
+    assert [str(host) for host in iterator] == ['a', 'b']
+    assert local.get('hosts.1').value() == 'b'
+    host = local.db.host
+    assert local.db.host is host
+    local.db.update({'host': 'remote'})
+    assert local.db.host.value() == 'remote'
+    assert local.get('db.host').value() == 'remote'
+    local.db.update({'host': 'other'})
+    assert local.get('db.host').value() == 'other'
+
+    local = Configurator(obj={'a': {'b': 3}})
+    assert local.a.b() == 3 and local.get('a.b')() == 3
+    local.value()['a']['b'] = 4
+    assert local.a.b() == 4 and local.get('a.b')() == 4
+    assert local.a.missing.value() is None and local.get('a.missing').value() is None
+    assert local.a._children.keys() == {'b'}
+
+
+def test_config_secret(tmp_path, monkeypatch):
+    path = tmp_path / 'secret.yaml'
+    path.write_text('TOKEN: one\n')
+    backend = FileSecretBackend(str(path))
+    values = backend.values()
+    assert backend.get('TOKEN') == 'one'
+    assert backend.values() is values
+
+    path.write_text('TOKEN: two\n')
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert backend.get('TOKEN') == 'one'
+    backend.reset()
+    assert backend.get('TOKEN') == 'two'
+
+    missing = FileSecretBackend(str(tmp_path / 'missing.yaml'))
+    stat = os.stat
+    calls = []
+    monkeypatch.setattr(os, 'stat', lambda *args, **kwargs: calls.append(args) or stat(*args, **kwargs))
+    assert missing.get('TOKEN') is None and missing.get('PASSWORD') is None
+    assert len(calls) == 1
+    missing.reset()
+    (tmp_path / 'missing.yaml').write_text('TOKEN: created\n')
+    assert missing.get('TOKEN') == 'created'
+    monkeypatch.undo()
+
+    try:
+        SecretBackend()
+        assert False
+    except TypeError:
+        pass
+
+    monkeypatch.setenv('APP_TOKEN', 'environ')
+    vault = VaultSecretBackend({'PASSWORD': 'vault'})
+    backends = SecretStorage.backends
+    SecretStorage.set_backends(EnvironSecretBackend('APP_'), backend)
+    SecretStorage.add_backend(vault)
+    try:
+        value = yaml.load('{token: !secret TOKEN, password: !secret PASSWORD, missing: !secret MISSING}',
+                          Loader=yaml.Loader)
+        assert value == {'token': 'environ', 'password': 'vault', 'missing': None}
+    finally:
+        SecretStorage.backends = backends
+
@@ -1,6 +1,11 @@
+import asyncio
+import threading
+
+import pytest
+
 from .app.instance import Muscular
 from .app.instance import Strategy
-from ...src.muscles.core.core import BaseStrategy
+from ...src.muscles.core.core import BaseStrategy, AsyncBaseStrategy, Context, Dependency
 
 
 def start_response(status, headers):
@@ -35,7 +40,7 @@ class StrategyAfter(BaseStrategy):
 
 class StrategyAllTrigger(BaseStrategy):
     def execute(self, *args, **kwargs):
-        return "Strategy Apply" + kwargs['before'] + kwargs['context'] + kwargs['after']
+        return "Strategy Apply" + kwargs['before'] + kwargs['context'] + kwargs.get('after', '')
 
 
 def test_context0():
@@ -79,12 +84,248 @@ def test_context3_with_context():
     app = muscular()
     assert app == 'Strategy ApplyAdd Context String'
 
+    # Параметры, установленные в after_start, принадлежат слою завершенного запроса и не видны следующему
     muscular = Muscular()
     muscular.context.strategy = StrategyAfter
-    app = muscular()
-    assert app == 'Strategy ApplyAdd After String'
+    with pytest.raises(KeyError, match='after'):
+        muscular()
+    assert 'after' not in muscular.context.params
 
     muscular = Muscular()
     muscular.context.strategy = StrategyAllTrigger
     app = muscular()
-    assert app == 'Strategy ApplyAdd Before StringAdd Context StringAdd After String'
+    assert app == 'Strategy ApplyAdd Before StringAdd Context String'
+
+
+class StrategyParam(BaseStrategy):
+    def execute(self, *args, **kwargs):
+        return kwargs.get('user')
+
+
+def test_context_isolated_params():
+    """
+    Проверяем, что параметры, установленные во время выполнения, не видны другим запросам
+    :return:
+    """
+    context = Context(StrategyParam, {'host': 'localhost'})
+    started = threading.Barrier(2)
+    results = {}
+
+    @context.context()
+    def set_user(owner, self_context):
+        self_context.set_param('user', threading.current_thread().name)
+        started.wait(5)
+        assert self_context.param('host') == 'localhost'
+
+    def worker():
+        results[threading.current_thread().name] = context.execute()
+
+    threads = [threading.Thread(target=worker, name='user%s' % i) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    context.remove_hook(set_user)
+
+    assert results == {'user0': 'user0', 'user1': 'user1'}
+    assert 'user' not in context.params
+
+    other_context = Context(StrategyParam, params={'user': 'other'})
+    assert other_context.execute() == 'other'
+    assert context.execute() is None
+    assert 'user' not in context.params and 'host' not in other_context.params
+
+
+
+class StrategyCounter(BaseStrategy):
+    def __init__(self):
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        self.calls += 1
+        return self
+
+
+def test_context_strategy_reuse():
+    """
+    Проверяем повторное использование объекта стратегии и обработчики, привязанные к контексту
+    :return:
+    """
+    context = Context(StrategyCounter)
+    assert context.execute() is not context.execute()
+
+    context = Context(StrategyCounter, reuse_strategy='context')
+    first = context.execute()
+    assert context.execute() is first and first.calls == 2
+
+    context = Context(StrategyCounter, reuse_strategy='thread')
+    first = context.execute()
+    assert context.execute() is first
+    other = []
+    thread = threading.Thread(target=lambda: other.append(context.execute()))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+    context.strategy = StrategyCounter
+    assert context.execute() is not first
+
+    calls = []
+    other_context = Context(StrategyCounter)
+
+    @context.before_start()
+    def before(owner):
+        calls.append('before')
+
+    @context.after_start()
+    def after(owner, result):
+        calls.append('after')
+
+    other_context.execute()
+    assert calls == []
+    context.execute()
+    assert calls == ['before', 'after']
+    context.remove_hook(after)
+    context.execute()
+    assert calls == ['before', 'after', 'before']
+
+
+class StrategyAsync(AsyncBaseStrategy):
+    async def execute(self, *args, **kwargs):
+        await asyncio.sleep(0.01)
+        return kwargs['user']
+
+
+def test_context_async():
+    """
+    Проверяем асинхронное выполнение контекста с корутинными обработчиками
+    :return:
+    """
+    context = Context(StrategyAsync)
+    calls = []
+
+    @context.before_start()
+    async def before(owner):
+        await asyncio.sleep(0)
+        calls.append('before')
+
+    @context.context()
+    def set_user(owner, self_context):
+        self_context.set_param('user', asyncio.current_task().get_name())
+
+    @context.after_start()
+    async def after(owner, result):
+        calls.append(result)
+
+    async def main():
+        return await asyncio.gather(*[asyncio.create_task(context.aexecute(), name='task%s' % i) for i in range(3)])
+
+    assert asyncio.run(main()) == ['task0', 'task1', 'task2']
+    assert calls.count('before') == 3 and sorted(calls[3:]) == ['task0', 'task1', 'task2']
+
+    calls.clear()
+    with pytest.raises(Exception, match='aexecute'):
+        context.execute()
+    assert calls == []
+
+    context.remove_hook(before)
+    context.remove_hook(after)
+    context.remove_hook(set_user)
+    with pytest.raises(Exception, match='aexecute'):
+        context.execute()
+
+
+
+def test_context_timings():
+    """
+    Проверяем замер времени выполнения обработчиков и этапов контекста
+    :return:
+    """
+    context = Context(Strategy1)
+    samples = []
+
+    @context.before_start()
+    def slow_before(owner):
+        pass
+
+    context.execute()
+    assert context.timings() == {}
+
+    context.enable_timings(window=10, sink=lambda name, elapsed: samples.append(name))
+    for _ in range(20):
+        context.execute()
+    timings = context.timings()
+    assert set(timings) == {'before_start', 'before_start.' + slow_before.__qualname__, 'context', 'strategy',
+                            'after_start', 'total'}
+    assert timings['total']['count'] == 10
+    assert timings['total']['p50'] <= timings['total']['p95'] <= timings['total']['p99'] <= timings['total']['max']
+    assert samples.count('strategy') == 20
+
+    asyncio.run(context.aexecute())
+    assert samples.count('strategy') == 21
+
+    context.disable_timings()
+    context.execute()
+    assert context.timings() == {} and samples.count('strategy') == 21
+
+
+class StrategyItem(BaseStrategy):
+    def execute(self, item, *args, **kwargs):
+        if item < 0:
+            raise ValueError(item)
+        return item * kwargs.get('factor', 1)
+
+
+def test_context_execute_many():
+    """
+    Проверяем выполнение стратегии для набора элементов в пуле потоков и процессов
+    :return:
+    """
+    context = Context(StrategyItem)
+    assert context.execute_many(range(10), workers=3) == [item for item in range(10)]
+    assert sorted(context.map(range(10), workers=3, ordered=False, factor=2)) == [item * 2 for item in range(10)]
+
+    results = context.execute_many([1, -1, 2], return_exceptions=True)
+    assert results[0] == 1 and isinstance(results[1], ValueError) and results[2] == 2
+    with pytest.raises(ValueError):
+        context.execute_many([1, -1, 2])
+
+    calls = []
+
+    @context.before_start()
+    def before(owner):
+        calls.append('before')
+
+    @context.after_start()
+    def after(owner, result):
+        calls.append(result)
+
+    context.execute_many([1, 2], workers=1)
+    assert calls == ['before', 1, 'before', 2]
+    calls.clear()
+    context.execute_many([1, 2], hooks='batch')
+    assert calls == ['before', [1, 2]]
+    calls.clear()
+
+    assert context.execute_many([1, 2, 3], pool='process', workers=2) == [1, 2, 3]
+    assert calls.count('before') == 3 and [call for call in calls if call != 'before'] == [1, 2, 3]
+
+    class Test1Interface:
+        pass
+
+    class Test11Dependency(Test1Interface):
+        pass
+
+    class Test12Dependency(Test1Interface):
+        pass
+
+    class StrategyDependency(BaseStrategy):
+        def execute(self, *args, **kwargs):
+            return type(Dependency.resolve(Test1Interface)).__name__
+
+    Dependency(Test1Interface, Test11Dependency)
+    context = Context(StrategyDependency)
+    with Dependency.override(Test1Interface, Test12Dependency):
+        assert context.execute_many([1, 2], workers=2) == ['Test12Dependency', 'Test12Dependency']
+        assert context.execute_many([1, 2], hooks='batch') == ['Test12Dependency', 'Test12Dependency']
+    assert context.execute_many([1]) == ['Test11Dependency']
@@ -1,7 +1,16 @@
+import asyncio
+import threading
 from abc import abstractmethod
+from contextlib import ExitStack
+
+import pytest
+
 from ...src.muscles.core.core import Dependency
 from ...src.muscles.core.core import inject
 from ...src.muscles.core.core import ApplicationMeta
+from ...src.muscles.core.core import BaseStrategy, Context
+from ...src.muscles.core.core import SINGLETON, SCOPED, TRANSIENT, LazyDependency
+from ...src.muscles.core.core import DependencyStorage, DependencyException, DependencyCycleException
 
 
 class TestInterface:
@@ -44,6 +53,21 @@ def test_dependency():
     main2()
 
 
+def test_dependency_explicit_argument():
+    """
+    Проверяем, что явно переданный аргумент не заменяется зависимостью
+    :return:
+    """
+    Dependency(TestInterface, Test1Dependency)
+
+    @inject(TestInterface)
+    def main(value, test: TestInterface, other: TestInterface = Test2Dependency()):
+        return value, test.test(), other.test()
+
+    assert main(1) == (1, 'Active 1', 'Active 2')
+    assert main(2, test=Test2Dependency()) == (2, 'Active 2', 'Active 2')
+
+
 def test_dependency_non_progressive():
     """
     Проверяем в режиме удовлетворения зависимостей progressive=True и progressive=False
@@ -264,3 +288,289 @@ def test_dependency_with_app():
     with Dependency(TestAppInterface, TestApp1) as di:
         assert di.test() == 'Active 1'
 
+
+
+def test_dependency_lifetime():
+    """
+    Проверяем время жизни объектов зависимостей SINGLETON, SCOPED и TRANSIENT
+    :return:
+    """
+
+    class Test7Interface:
+        pass
+
+    class Test71Dependency(Test7Interface):
+        pass
+
+    class Test72Dependency(Test7Interface):
+        pass
+
+    Dependency(Test7Interface, Test71Dependency, lifetime=SINGLETON)
+    singleton = Dependency.resolve(Test7Interface)
+    assert Dependency.resolve(Test7Interface) is singleton
+
+    with Dependency(Test7Interface, Test72Dependency) as di:
+        assert isinstance(di, Test72Dependency)
+        assert Dependency.resolve(Test7Interface) is di
+    assert Dependency.resolve(Test7Interface) is singleton
+
+    class Test8Interface:
+        pass
+
+    Dependency(Test8Interface, Test71Dependency, lifetime=SCOPED)
+    assert Dependency.resolve(Test8Interface) is not Dependency.resolve(Test8Interface)
+
+    class ScopedStrategy(BaseStrategy):
+        def execute(self, *args, **kwargs):
+            return Dependency.resolve(Test8Interface), Dependency.resolve(Test8Interface)
+
+    context = Context(ScopedStrategy)
+    first, second = context.execute()
+    assert first is second
+    third, fourth = context.execute()
+    assert third is fourth and third is not first
+
+    class Test9Interface:
+        pass
+
+    Dependency(Test9Interface, Test71Dependency, lifetime=TRANSIENT)
+    assert Dependency.resolve(Test9Interface) is not Dependency.resolve(Test9Interface)
+
+
+def test_dependency_lazy():
+    """
+    Проверяем отложенное создание объекта зависимости
+    :return:
+    """
+    built = []
+
+    class Test10Interface:
+        pass
+
+    class Test10Dependency(Test10Interface):
+        def __init__(self, name):
+            built.append(name)
+            self.name = name
+
+        def test(self):
+            return "Active " + self.name
+
+    Dependency(Test10Interface, Test10Dependency, "lazy", lazy=True)
+
+    @inject(Test10Interface)
+    def main(test: Test10Interface):
+        assert built == []
+        assert test.test() == 'Active lazy'
+        assert test.name == 'lazy'
+        assert built == ['lazy']
+
+    main()
+
+
+def test_dependency_async():
+    """
+    Проверяем асинхронные фабрики зависимостей и inject для корутин
+    :return:
+    """
+
+    class Test11Interface:
+        pass
+
+    class Test11Dependency(Test11Interface):
+        def test(self):
+            return "Active async"
+
+    async def factory():
+        await asyncio.sleep(0)
+        return Test11Dependency()
+
+    Dependency(Test11Interface, factory, lifetime=SINGLETON)
+
+    @inject(Test11Interface)
+    async def main(test: Test11Interface):
+        return test
+
+    with pytest.raises(DependencyException):
+        Dependency.resolve(Test11Interface)
+    first = asyncio.run(main())
+    assert first.test() == 'Active async'
+    assert asyncio.run(main()) is first
+    assert asyncio.run(Dependency.aresolve(Test11Interface)) is first
+
+
+def test_dependency_graph():
+    """
+    Проверяем разрешение зависимостей конструктора по аннотациям и обнаружение циклов
+    :return:
+    """
+
+    class ConfigInterface:
+        pass
+
+    class PoolInterface:
+        pass
+
+    class RepositoryInterface:
+        pass
+
+    class Config(ConfigInterface):
+        def __init__(self, dsn):
+            self.dsn = dsn
+
+    class Pool(PoolInterface):
+        def __init__(self, config: ConfigInterface):
+            self.config = config
+
+    class Repository(RepositoryInterface):
+        def __init__(self, pool: PoolInterface, config: ConfigInterface, limit=10):
+            self.pool = pool
+            self.config = config
+            self.limit = limit
+
+    Dependency(ConfigInterface, Config, "db://local", lifetime=SINGLETON)
+    Dependency(PoolInterface, Pool, lifetime=SINGLETON)
+    Dependency(RepositoryInterface, Repository)
+
+    ds = DependencyStorage()
+    assert [step[0] for step in ds.plan(RepositoryInterface)] == [ConfigInterface, PoolInterface, RepositoryInterface]
+
+    repository = Dependency.resolve(RepositoryInterface)
+    assert repository.pool.config.dsn == 'db://local'
+    assert repository.config is repository.pool.config
+    assert Dependency.resolve(RepositoryInterface).pool is repository.pool
+    assert Dependency.resolve(RepositoryInterface) is not repository
+
+    class AInterface:
+        pass
+
+    class BInterface:
+        pass
+
+    class A(AInterface):
+        def __init__(self, b: BInterface):
+            self.b = b
+
+    class B(BInterface):
+        def __init__(self, a: AInterface):
+            self.a = a
+
+    Dependency(AInterface, A)
+    Dependency(BInterface, B)
+    with pytest.raises(DependencyCycleException):
+        ds.validate()
+    with pytest.raises(DependencyCycleException):
+        Dependency.resolve(AInterface)
+
+
+def test_dependency_override():
+    """
+    Проверяем, что переопределения зависимостей видны только текущему потоку
+    :return:
+    """
+
+    class Test12Interface:
+        pass
+
+    class Test121Dependency(Test12Interface):
+        pass
+
+    class Test122Dependency(Test12Interface):
+        pass
+
+    Dependency(Test12Interface, Test121Dependency)
+    seen = []
+    entered = threading.Event()
+    checked = threading.Event()
+
+    def worker():
+        entered.wait(5)
+        try:
+            seen.append(Dependency.resolve(Test12Interface))
+        finally:
+            checked.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    with Dependency(Test12Interface, Test122Dependency) as di:
+        assert isinstance(di, Test122Dependency)
+        entered.set()
+        checked.wait(5)
+        assert isinstance(Dependency.resolve(Test12Interface), Test122Dependency)
+    thread.join()
+    assert isinstance(seen[0], Test121Dependency)
+    assert isinstance(Dependency.resolve(Test12Interface), Test121Dependency)
+
+    with Dependency.override(Test12Interface, Test122Dependency, lifetime=SINGLETON) as di:
+        assert Dependency.resolve(Test12Interface) is di
+    assert isinstance(Dependency.resolve(Test12Interface), Test121Dependency)
+
+    with Dependency(Test12Interface, Test122Dependency, lifetime=SINGLETON, lazy=True) as di:
+        assert isinstance(di, LazyDependency)
+        assert Dependency.resolve(Test12Interface).resolve() is di.resolve()
+    assert isinstance(Dependency.resolve(Test12Interface), Test121Dependency)
+    assert Dependency.resolve(Test12Interface) is not Dependency.resolve(Test12Interface)
+    assert DependencyStorage().storage(Test12Interface)[0] is Test121Dependency
+
+    with Dependency.override(Test12Interface, Test122Dependency, lazy=True):
+        proxy = Dependency.resolve(Test12Interface)
+    assert isinstance(proxy, LazyDependency)
+    assert isinstance(proxy.resolve(), Test122Dependency)
+
+    with ExitStack() as stack:
+        di = stack.enter_context(Dependency(Test12Interface, Test122Dependency, lifetime=SINGLETON))
+        assert Dependency.resolve(Test12Interface) is di
+    assert isinstance(Dependency.resolve(Test12Interface), Test121Dependency)
+    assert Dependency.resolve(Test12Interface) is not Dependency.resolve(Test12Interface)
+
+    replacement = Dependency(Test12Interface, Test122Dependency)
+    assert isinstance(Dependency.resolve(Test12Interface), Test122Dependency)
+    with replacement as di:
+        assert isinstance(di, Test122Dependency)
+    assert isinstance(Dependency.resolve(Test12Interface), Test121Dependency)
+    with replacement as di:
+        assert isinstance(di, Test122Dependency)
+    assert isinstance(Dependency.resolve(Test12Interface), Test121Dependency)
+
+
+def test_dependency_stats():
+    """
+    Проверяем сбор статистики разрешения зависимостей
+    :return:
+    """
+
+    class Test13Interface:
+        pass
+
+    class Test14Interface:
+        pass
+
+    class Test131Dependency(Test13Interface):
+        pass
+
+    class Test141Dependency(Test14Interface):
+        def __init__(self, item: Test13Interface):
+            self.item = item
+
+    Dependency(Test13Interface, Test131Dependency, lifetime=SINGLETON)
+    Dependency(Test14Interface, Test141Dependency)
+
+    ds = DependencyStorage()
+    Dependency.resolve(Test14Interface)
+    assert Test14Interface.__name__ not in ds.stats()
+
+    events = []
+    ds.enable_stats(lambda interface, elapsed: events.append((interface, elapsed)))
+    try:
+        Dependency.resolve(Test14Interface)
+        Dependency.resolve(Test14Interface)
+        stats = ds.stats()
+        assert stats[Test13Interface.__name__]['hits'] == 2
+        assert stats[Test13Interface.__name__]['builds'] == 0
+        assert stats[Test14Interface.__name__]['resolutions'] == 2
+        assert stats[Test14Interface.__name__]['builds'] == 2
+        assert stats[Test14Interface.__name__]['max_time'] <= stats[Test14Interface.__name__]['time']
+        assert (Test13Interface, None) in events
+        assert len(events) == 4
+    finally:
+        ds.disable_stats()
+    assert ds.stats() == {}
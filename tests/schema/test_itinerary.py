@@ -0,0 +1,338 @@
+import uuid
+from urllib.parse import quote
+
+import pytest
+
+from ...src.muscles.core.schema import Itinerary
+from ...src.muscles.core.schema.itinerary import parse_route
+from ...src.muscles.core.schema import DefaultRule, VarRule, IntRule, FloatRule, UUIDRule
+from ...src.muscles.core.schema import PathParameter, QueryParameter, HeaderParameter, Integer, String
+from ...src.muscles.core.exceptions import ErrorException, NotFoundException, AccessDeniedException
+from ...src.muscles.core.exceptions import ApplicationException, RequestErrorException
+
+
+class LegacyDefaultRule:
+    name = 'default'
+
+    def is_match(self, path, route):
+        return path.lower() == route
+
+    def compile(self, value):
+        return value
+
+
+class LegacyVarRule:
+    name = 'var'
+
+    def is_match(self, path, route):
+        return len(path) > 0
+
+    def compile(self, value):
+        return quote(str(value))
+
+
+class LegacyIntRule:
+    name = 'int'
+
+    def is_match(self, path, route):
+        return path.isdigit()
+
+    def compile(self, value):
+        return str(int(value))
+
+
+class ApiItinerary(Itinerary):
+    rules = [LegacyDefaultRule(), LegacyVarRule(), LegacyIntRule()]
+
+
+def make_handler(name):
+    def func(*args, **kwargs):
+        return name
+
+    func.__name__ = name
+    return func
+
+
+def test_match():
+    """
+    Проверяем поиск узла по скомпилированному дереву маршрутов
+    :return:
+    """
+    routes = ApiItinerary(name='test_match')
+    routes.add('/user/{id:int}', key='user.view', handler=make_handler('view'))
+    routes.add('/user/me', key='user.me', handler=make_handler('me'))
+    routes.add('/user/{name}/posts', key='user.posts', handler=make_handler('posts'))
+    routes.add('/user/{id:int}/{slug}', key='user.slug', handler=make_handler('slug'))
+
+    assert routes.match('/user/10').key == 'user.view'
+    assert routes.match('/user/me').key == 'user.me'
+    assert routes.match('/USER/me').key == 'user.me'
+    assert routes.match('/user/10/posts').key == 'user.slug'
+    assert routes.match('/user/alex/posts').key == 'user.posts'
+    assert routes.match('/user') is None
+    assert routes.match('/user/alex') is None
+    assert routes.match('/unknown') is None
+
+
+def test_match_rebuild():
+    """
+    Проверяем пересборку дерева маршрутов после добавления маршрута
+    :return:
+    """
+    routes = ApiItinerary(name='test_match_rebuild')
+    routes.add('/', key='main', handler=make_handler('main'))
+    assert routes.match('/').key == 'main'
+    assert routes.match('/page') is None
+
+    matcher = routes.matcher
+    routes.add('/page', key='page', handler=make_handler('page'))
+    assert routes.matcher is not matcher
+    assert routes.match('/page').key == 'page'
+
+
+class Request:
+
+    def __init__(self, path, method='GET', content_type='text/html'):
+        self.path = path
+        self.method = method
+        self.content_type = content_type
+
+
+def test_get_current_route():
+    """
+    Проверяем выбор маршрута по методу и типу контента
+    :return:
+    """
+    routes = ApiItinerary(name='test_get_current_route')
+    routes.add('/item', key='item', handler=make_handler('get'), method='GET', content_type='text/html')
+    routes.add('/item', key='item', handler=make_handler('json'), method='get', content_type='Application/JSON')
+    routes.add('/item', key='item', handler=make_handler('any'), method='*')
+    routes.add('/item', key='item', handler=make_handler('post'), method='POST', content_type='text/html')
+
+    route, params = routes.get_current_route(Request('/item'))
+    assert route['handler'].__name__ == 'get'
+    route, params = routes.get_current_route(Request('/item', content_type='application/json'))
+    assert route['handler'].__name__ == 'json'
+    route, params = routes.get_current_route(Request('/item', method='post'))
+    assert route['handler'].__name__ == 'any'
+    route, params = routes.get_current_route(Request('/item', method='DELETE', content_type='text/xml'))
+    assert route['handler'].__name__ == 'any'
+    assert routes.get_current_route(Request('/missing')) == (None, ())
+
+
+def test_route_cache():
+    """
+    Проверяем кеш разрешения маршрутов
+    :return:
+    """
+    routes = ApiItinerary(name='test_route_cache', cache_size=2)
+    routes.add('/user/{id:int}', key='user.view', handler=make_handler('view'), method='GET')
+
+    route, params = routes.get_current_route(Request('/user/10'))
+    assert route['handler'].__name__ == 'view'
+    assert params == {'id': '10'}
+    params['id'] = '11'
+    route, params = routes.get_current_route(Request('/user/10'))
+    assert params == {'id': '10'}
+    assert routes.cache_info() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+    routes.get_current_route(Request('/user/11'))
+    routes.get_current_route(Request('/user/12'))
+    assert routes.cache_info()['size'] == 2
+
+    routes.add('/user/{id:int}', key='user.view', handler=make_handler('post'), method='POST')
+    assert routes.cache_info()['size'] == 0
+    route, params = routes.get_current_route(Request('/user/10', method='POST'))
+    assert route['handler'].__name__ == 'post'
+
+
+def test_to_url():
+    """
+    Проверяем формирование ссылок по ключу маршрута
+    :return:
+    """
+    routes = ApiItinerary(name='test_to_url')
+    routes.add('/user/{id:int}/post-{slug}', key='user.post', handler=make_handler('post'))
+    routes.add('/user/{id:int}/post-{slug}', key='user.post', handler=make_handler('put'), method='PUT')
+
+    assert routes.to_url('user.post', {'id': '7', 'slug': 'a b'}) == 'user/7/post-a%20b'
+    assert routes.to_url('missing', {}) == ''
+    assert routes.to_urls([
+        ('user.post', {'id': 1, 'slug': 'x'}),
+        ('user.post', {'id': 2, 'slug': 'y'}),
+        ('missing', {}),
+    ]) == ['user/1/post-x', 'user/2/post-y', '']
+
+
+def test_get_current_static():
+    """
+    Проверяем выбор обработчика статических файлов по самому длинному префиксу
+    :return:
+    """
+    routes = ApiItinerary(name='test_get_current_static')
+    routes.add_static('/var/www', handler=make_handler('default'), full_path=True)
+    routes.add_static('/var/static', prefix='/static', handler=make_handler('static'), full_path=True)
+    routes.add_static('/var/media', prefix='/static/Media', handler=make_handler('media'), full_path=True)
+
+    assert routes.get_current_static(Request('/static/app.css'))['handler'].__name__ == 'static'
+    assert routes.get_current_static(Request('/STATIC/media/a.png'))['handler'].__name__ == 'media'
+    assert routes.get_current_static(Request('/static/media'))['handler'].__name__ == 'static'
+    assert routes.get_current_static(Request('/static'))['handler'].__name__ == 'default'
+    assert routes.get_current_static(Request('/favicon.ico'))['handler'].__name__ == 'default'
+    assert ApiItinerary(name='test_get_current_static_empty').get_current_static(Request('/a/b')) is None
+
+
+class ErrorItinerary(ApiItinerary):
+    error_handler_map = []
+
+
+class OtherErrorItinerary(ApiItinerary):
+    error_handler_map = []
+
+
+def test_get_current_error_handler():
+    """
+    Проверяем выбор обработчика ошибки по коду, классу исключения и по умолчанию
+    :return:
+    """
+    routes = ErrorItinerary(name='test_get_current_error_handler')
+    assert routes.get_current_error_handler(ErrorException(status=500)) is None
+
+    routes.add_error_handler(None, make_handler('default'))
+    routes.add_error_handler(404, make_handler('not_found'))
+    routes.add_error_handler(ErrorException, make_handler('error'))
+    routes.add_error_handler(KeyError, make_handler('key'))
+
+    assert routes.get_current_error_handler(ErrorException(status=404))['handler'].__name__ == 'not_found'
+    assert routes.get_current_error_handler(NotFoundException(status=404))['handler'].__name__ == 'not_found'
+    assert routes.get_current_error_handler(NotFoundException(status=410))['handler'].__name__ == 'error'
+    assert routes.get_current_error_handler(AccessDeniedException())['handler'].__name__ == 'error'
+    assert routes.get_current_error_handler(KeyError('id'))['handler'].__name__ == 'key'
+    assert routes.get_current_error_handler(ValueError())['handler'].__name__ == 'default'
+
+    routes.add_error_handler(ValueError, make_handler('value'))
+    assert routes.get_current_error_handler(ValueError())['handler'].__name__ == 'value'
+    with pytest.raises(Exception):
+        routes.add_error_handler(404, make_handler('again'))
+
+    other = OtherErrorItinerary(name='test_get_current_error_handler')
+    assert other.get_current_error_handler(ErrorException(status=404)) is None
+    other.add_error_handler(404, make_handler('other'))
+    assert other.get_current_error_handler(ErrorException(status=404))['handler'].__name__ == 'other'
+    assert routes.get_current_error_handler(ErrorException(status=404))['handler'].__name__ == 'not_found'
+
+
+def test_add_unique():
+    """
+    Проверяем уникальность маршрутов при регистрации
+    :return:
+    """
+    routes = ApiItinerary(name='test_add_unique')
+    routes.add('/news/{id:int}', key='news', handler=make_handler('news'), method='GET')
+    with pytest.raises(Exception):
+        routes.add('/news/{id:int}', key='news', handler=make_handler('news'), method='GET')
+    routes.add('/news/{id:int}', key='news', handler=make_handler('news'), method='POST')
+    routes.add('/news/{id:int}/comments', handler=make_handler('comments'))
+    routes.add('/news/{id:int}/comments', handler=make_handler('comments'))
+    assert len(routes.nodes_map) == 3
+    assert len(routes.node.childrens) == 1
+    assert routes.node.get_children_node('NEWS').get_children_node('{id:int}').key == 'news'
+
+
+def test_parse_route():
+    """
+    Проверяем разбор шаблона маршрута
+    :return:
+    """
+    segments = parse_route('user/{id:int}/post-{slug}')
+    assert [segment.route for segment in segments] == ['user', '{id:int}', '{slug:var}']
+    assert [segment.name for segment in segments] == [None, 'id', 'slug']
+    assert [segment.rule for segment in segments] == ['default', 'int', 'var']
+    assert segments[2].parts == ['post-', ('slug', 'var')]
+    assert parse_route('user/{id:int}/post-{slug}') is segments
+
+
+class TypedItinerary(Itinerary):
+    rules = [DefaultRule(), VarRule(), IntRule(), FloatRule(), UUIDRule()]
+
+
+def test_typed_rules():
+    """
+    Проверяем правила, которые проверяют и преобразуют параметры за один проход
+    :return:
+    """
+    routes = TypedItinerary(name='test_typed_rules')
+    routes.add('/order/{id:int}', key='order', handler=make_handler('order'))
+    routes.add('/order/{uid:uuid}', key='order.uuid', handler=make_handler('uuid'))
+    routes.add('/price/{value:float}/{title}', key='price', handler=make_handler('price'))
+
+    assert routes.match_with_params('/order/42')[1] == {'id': 42}
+    node, params = routes.match_with_params('/order/7d444840-9dc0-11d1-b245-5ffdce74fad2')
+    assert node.key == 'order.uuid'
+    assert params == {'uid': uuid.UUID('7d444840-9dc0-11d1-b245-5ffdce74fad2')}
+    assert routes.match_with_params('/order/abc') == (None, {})
+    assert routes.match_with_params('/price/1.5/a%20b')[1] == {'value': 1.5, 'title': 'a b'}
+    assert routes.to_url('price', {'value': 1.5, 'title': 'a b'}) == 'price/1.5/a%20b'
+
+
+def test_action_arguments():
+    """
+    Проверяем проверку аргументов обработчика действия
+    :return:
+    """
+    routes = ApiItinerary(name='test_action_arguments')
+
+    @routes.action(route='/view')
+    def view(id=None):
+        return id
+
+    @routes.action(route='/list')
+    def items(page=None, **kwargs):
+        return page, kwargs
+
+    assert view(id=1) == 1
+    with pytest.raises(ApplicationException):
+        view(id=1, page=2)
+    assert items(page=1, sort='name') == (1, {'sort': 'name'})
+
+
+def test_argument_binder():
+    """
+    Проверяем связывание аргументов обработчика с параметрами запроса
+    :return:
+    """
+    routes = TypedItinerary(name='test_argument_binder')
+
+    @routes.controller('/catalog')
+    class Catalog:
+
+        @routes.action(route='{id:int}', parameters=[
+            PathParameter('id', Integer, required=True),
+            QueryParameter('page', Integer),
+            QueryParameter('tags', String, multiple=True),
+            QueryParameter('unused', String, required=True),
+            HeaderParameter('X-Token', String, required=True),
+        ])
+        def view(self, request, id, page=1, tags=None, **kwargs):
+            return id, page, tags, kwargs
+
+    binder = Catalog.view.binder
+    request = Request('/catalog/5')
+    route, params = routes.get_current_route(request)
+    kwargs = binder.bind(request=request, path=params, query={'page': ['2'], 'tags': ['a', 'b'], 'unused': 'x'},
+                         headers={'HTTP_X_TOKEN': 'secret'})
+    assert kwargs == {'request': request, 'id': 5, 'page': 2, 'tags': ['a', 'b'], 'unused': 'x', 'X-Token': 'secret'}
+    assert [step[0] for step in binder.steps] == ['request', 'id', 'page', 'tags', 'unused', 'X-Token']
+
+    with pytest.raises(RequestErrorException):
+        binder.bind(path=params, query={'page': 'first', 'unused': 'x'}, headers={'x-token': 'secret'})
+    with pytest.raises(RequestErrorException):
+        binder.bind(path=params, query={'unused': 'x'})
+
+    def user(userId):
+        return userId
+
+    routes.add('/user/{userId:int}', key='user', handler=user, method='GET')
+    route, params = routes.get_current_route(Request('/user/7'))
+    assert params == {'userid': 7}
+    assert user.binder.bind(path=params) == {'userId': 7}
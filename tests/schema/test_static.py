@@ -0,0 +1,97 @@
+import os
+import time
+
+from ...src.muscles.core.schema import StaticHandler
+
+
+class StartResponse:
+
+    def __call__(self, status, headers):
+        self.status = status
+        self.headers = dict(headers)
+
+
+def test_static_handler(tmp_path, monkeypatch):
+    """
+    Проверяем отдачу статических файлов, ETag и условные запросы
+    :return:
+    """
+    (tmp_path / 'app.css').write_bytes(b'body {}')
+    (tmp_path / 'big.bin').write_bytes(b'x' * 100)
+    handler = StaticHandler(str(tmp_path), prefix='/static', memory_max_size=10)
+
+    start_response = StartResponse()
+    body = handler({'PATH_INFO': '/static/app.css'}, start_response)
+    assert start_response.status == '200 OK'
+    assert start_response.headers['Content-Type'] == 'text/css'
+    assert start_response.headers['Content-Length'] == '7'
+    assert b''.join(body) == b'body {}'
+    assert handler({'PATH_INFO': '/static/app.css'}, start_response)[0] is body[0]
+    etag = start_response.headers['ETag']
+
+    body = handler({'PATH_INFO': '/static/app.css', 'HTTP_IF_NONE_MATCH': etag}, start_response)
+    assert start_response.status == '304 Not Modified'
+    assert list(body) == []
+
+    last_modified = start_response.headers['Last-Modified']
+    handler({'PATH_INFO': '/static/app.css', 'HTTP_IF_MODIFIED_SINCE': last_modified}, start_response)
+    assert start_response.status == '304 Not Modified'
+    monkeypatch.setenv('TZ', 'Asia/Tokyo')
+    time.tzset()
+    try:
+        handler({'PATH_INFO': '/static/app.css', 'HTTP_IF_MODIFIED_SINCE': last_modified.replace('GMT', '-0000')},
+                start_response)
+        assert start_response.status == '304 Not Modified'
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    body = handler({'PATH_INFO': '/static/big.bin', 'wsgi.file_wrapper': lambda f, size: ('wrapped', f)},
+                   start_response)
+    assert body[0] == 'wrapped'
+    body[1].close()
+
+    body = handler({'PATH_INFO': '/static/big.bin'}, start_response)
+    assert b''.join(body) == b'x' * 100
+    body.close()
+
+    handler({'PATH_INFO': '/static/../' + os.path.basename(tmp_path) + '/app.css'}, start_response)
+    assert start_response.status == '200 OK'
+    handler({'PATH_INFO': '/static/../../etc/passwd'}, start_response)
+    assert start_response.status == '404 Not Found'
+    handler({'PATH_INFO': '/static/a\x00b'}, start_response)
+    assert start_response.status == '404 Not Found'
+    handler({'PATH_INFO': '/static/app.css', 'REQUEST_METHOD': 'POST'}, start_response)
+    assert start_response.status == '405 Method Not Allowed'
+
+
+def test_static_handler_invalidation(tmp_path):
+    """
+    Проверяем сброс кеша метаданных при изменении файла
+    :return:
+    """
+    path = tmp_path / 'app.js'
+    path.write_bytes(b'one')
+    handler = StaticHandler(str(tmp_path))
+    static = handler.resolve('/app.js')
+    assert handler.resolve('/app.js') is static
+
+    path.write_bytes(b'three')
+    os.utime(path, ns=(static.mtime_ns + 10 ** 9, static.mtime_ns + 10 ** 9))
+    changed = handler.resolve('/app.js')
+    assert changed is not static
+    assert changed.size == 5
+    assert changed.etag != static.etag
+
+    big = tmp_path / 'big.bin'
+    big.write_bytes(b'y' * 20)
+    handler = StaticHandler(str(tmp_path), memory_max_size=10)
+    static = handler.resolve('/big.bin')
+    big.write_bytes(b'z' * 30)
+    os.utime(big, ns=(static.mtime_ns + 10 ** 9, static.mtime_ns + 10 ** 9))
+    fresh, file = handler.open(static)
+    assert fresh.size == 30 and handler.resolve('/big.bin') is fresh
+    body = handler.body(fresh, {}, file)
+    assert b''.join(body) == b'z' * 30
+    body.close()
+